@@ -1,13 +1,33 @@
-import streamlit as st
-import requests
-from urllib.parse import quote
-import json
 import time
-from datetime import datetime
-import qrcode
-from io import BytesIO
-import base64
-import pandas as pd
+run_started = time.perf_counter_ns()
+
+import streamlit as st
+import os
+import collections
+import hashlib
+import io
+import re
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ncra import config
+from ncra.analytics import get_aggregates
+from ncra.batch import BATCH_FIELDS, DISTRIBUTE, file_digest, iter_result_rows, iter_successful_links
+from ncra.cache import get_link_cache
+from ncra.engine import race, race_wins, shorten_and_test
+from ncra.health import get_health
+from ncra.export import EXPORT_FORMATS, iter_csv_rows, parquet_available, read_page, write_export
+from ncra.history import EXPORT_FIELDS, get_history_store
+from ncra.jobs import ACTIVE, get_job_queue
+from ncra.metrics import PHASES, get_metrics, start_metrics_server
+from ncra.pool import get_session_pool
+from ncra.profiler import get_profiler
+from ncra.providers import SERVICES
+from ncra.qr import build_qr_sheet, render_qr
+from ncra.redirect import start_redirect_server
+from ncra.urls import is_valid_url
+from ncra.verify import revalidate_history
 
 # Set page config
 st.set_page_config(
@@ -18,8 +38,6 @@ st.set_page_config(
 )
 
 # Initialize session state
-if 'history' not in st.session_state:
-    st.session_state.history = []
 if 'stats' not in st.session_state:
     st.session_state.stats = {'total_shortened': 0, 'successful': 0, 'failed': 0}
 
@@ -143,106 +161,118 @@ with col2:
     st.title("🔗 NCRA Link Shortener Pro")
     st.markdown('<p class="header-subtitle">The World\'s Most Advanced URL Shortener</p>', unsafe_allow_html=True)
 
-try:
-    st.image("images.jpg", use_container_width=True)
-except:
-    pass
+@st.cache_resource
+def load_banner():
+    """images.jpg read from disk once per process (None when missing)"""
+    try:
+        with open("images.jpg", "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+banner = load_banner()
+if banner:
+    st.image(banner, use_container_width=True)
 
 st.markdown("---")
 
-# Shortening functions with timing
-def shorten_url_shorturlat(long_url):
-    try:
-        start = time.time()
-        api_url = "https://www.shorturl.at/shortener.php"
-        response = requests.post(api_url, data={'url': long_url}, timeout=10)
-        elapsed = round((time.time() - start) * 1000, 2)
-        if response.status_code == 200:
-            result = response.text.strip()
-            if result.startswith('http'):
-                return result, elapsed, True
-        return None, elapsed, False
-    except Exception as e:
-        return None, 0, False
-
-def shorten_url_isgd(long_url):
-    try:
-        start = time.time()
-        api_url = f"https://is.gd/create.php?format=simple&url={quote(long_url)}"
-        response = requests.get(api_url, timeout=10)
-        elapsed = round((time.time() - start) * 1000, 2)
-        if response.status_code == 200 and response.text.startswith('http'):
-            return response.text.strip(), elapsed, True
-        return None, elapsed, False
-    except Exception as e:
-        return None, 0, False
-
-def shorten_url_vgd(long_url):
-    try:
-        start = time.time()
-        api_url = f"https://v.gd/create.php?format=simple&url={quote(long_url)}"
-        response = requests.get(api_url, timeout=10)
-        elapsed = round((time.time() - start) * 1000, 2)
-        if response.status_code == 200 and response.text.startswith('http'):
-            return response.text.strip(), elapsed, True
-        return None, elapsed, False
-    except Exception as e:
-        return None, 0, False
-
-def shorten_url_clckru(long_url):
-    try:
-        start = time.time()
-        api_url = "https://clck.ru/--"
-        response = requests.post(api_url, data={'url': long_url}, timeout=10)
-        elapsed = round((time.time() - start) * 1000, 2)
-        if response.status_code == 200 and response.text.startswith('http'):
-            return response.text.strip(), elapsed, True
-        return None, elapsed, False
-    except Exception as e:
-        return None, 0, False
-
-def shorten_url_ulvis(long_url):
-    try:
-        start = time.time()
-        api_url = "https://ulvis.net/api.php"
-        params = {'url': long_url}
-        response = requests.get(api_url, params=params, timeout=10)
-        elapsed = round((time.time() - start) * 1000, 2)
-        if response.status_code == 200 and response.text.startswith('http'):
-            return response.text.strip(), elapsed, True
-        return None, elapsed, False
-    except Exception as e:
-        return None, 0, False
-
-def test_short_url(short_url):
-    """Test if shortened URL works and get redirect destination"""
-    try:
-        response = requests.head(short_url, allow_redirects=True, timeout=5)
-        return response.status_code == 200, response.url
-    except:
-        return False, None
-
-def generate_qr_code(url):
-    """Generate QR code for URL"""
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(url)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    buffered = BytesIO()
-    img.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
-    return img_str
-
-def is_valid_url(url_string):
-    if not url_string:
-        return False
-    return url_string.startswith(('http://', 'https://'))
+# Engine singletons live in the ncra package, so they persist across reruns and sessions
+http_pool = get_session_pool()
+link_cache = get_link_cache()
+history_store = get_history_store()
+aggregates = get_aggregates()
+job_queue = get_job_queue()
+profiler = get_profiler()
+if config.METRICS_PORT:
+    start_metrics_server(config.METRICS_PORT)
+if config.LOCAL_BASE_URL and config.REDIRECT_PORT:
+    # Resolves links issued by the built-in NCRA Local provider
+    start_redirect_server(config.REDIRECT_PORT, config.REDIRECT_HOST)
 
-# Main tabs
-tab1, tab2, tab3, tab4 = st.tabs(["🚀 Shorten URLs", "📊 Analytics", "📜 History", "⚙️ Batch Processing"])
+def session_owner():
+    """Id scoping history (and batch jobs) to this browser session.
 
-with tab1:
+    Kept in the URL so it survives reloads and server restarts; anyone given the full URL
+    sees the same history.
+    """
+    if 'owner' not in st.session_state:
+        sid = st.query_params.get('sid', '')
+        st.session_state.owner = sid if re.fullmatch(r'[0-9a-f]{32}', sid) else uuid.uuid4().hex
+    if st.query_params.get('sid') != st.session_state.owner:
+        st.query_params['sid'] = st.session_state.owner
+    return st.session_state.owner
+
+owner = session_owner()
+
+def record_results(original_url, results):
+    """Add a shortening run to the history and the running analytics aggregates.
+
+    Services skipped because their circuit was open were never called, so they are left out
+    rather than counted as failures (the aggregates are also rebuilt from the history).
+    """
+    results = [result for result in results if not result.get('skipped')]
+    history_store.add_run(original_url, results, owner=owner)
+    for result in results:
+        aggregates.record(result)
+
+def render_result_card(result, original_url, show_qr, fastest=False, qr_format='PNG'):
+    if result.get('skipped'):
+        st.info(f"⏸️ {result['service']} - Skipped, service is currently failing (circuit open)")
+        return
+    if not result['success']:
+        st.warning(f"❌ {result['service']} - Failed to generate link")
+        return
+
+    with st.container():
+        st.markdown(f"""
+        <div class="link-card">
+            <h3>🏆 {result['service']} {'⚡ FASTEST' if fastest else ''}</h3>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        col1, col2 = st.columns([3, 1])
+        
+        with col1:
+            st.code(result['short_url'], language=None)
+            
+            subcol1, subcol2, subcol3 = st.columns(3)
+            with subcol1:
+                st.markdown(f'<span class="success-badge">✓ Working</span>' if result['working'] else '<span class="failed-badge">✗ Failed Test</span>', unsafe_allow_html=True)
+            with subcol2:
+                if result.get('cached'):
+                    st.markdown('<span class="speed-badge">💾 Cached</span>', unsafe_allow_html=True)
+                else:
+                    st.markdown(f'<span class="speed-badge">⚡ {result["elapsed"]}ms</span>', unsafe_allow_html=True)
+            with subcol3:
+                if st.button(f"🔗 Test Link", key=f"test_{result['service']}"):
+                    st.markdown(f"[Click to test]({result['short_url']})")
+            
+            if result.get('chain') and (len(result['chain']) > 2 or result['redirect_url'] != original_url):
+                with st.expander("🔍 Redirect Chain"):
+                    for hop in result['chain']:
+                        st.text(f"{hop['status']} {hop['method']} {hop['url']} ({hop['ms']}ms)")
+                    st.text(f"Final URL: {result['redirect_url']}")
+        
+        with col2:
+            # Rendered only once the card's QR toggle is on; render_qr memoizes repeats
+            if show_qr and st.toggle("📱 QR Code", key=f"qr_{result['service']}"):
+                st.image(render_qr(result['short_url'], box_size=6, border=2), width=150)
+                fmt = qr_format.lower()
+                st.download_button(
+                    "📥 Download QR",
+                    render_qr(result['short_url'], fmt=fmt),
+                    f"{result['service']}_qr.{fmt}",
+                    'image/svg+xml' if fmt == 'svg' else 'image/png',
+                    key=f"qr_download_{result['service']}"
+                )
+        
+        st.markdown("</div>", unsafe_allow_html=True)
+
+# Main tabs
+# Each tab is a fragment, so interacting with one reruns only that tab
+@st.fragment
+@profiler.timed("Shorten tab")
+def shorten_tab():
     # Display stats at top
     col1, col2, col3, col4 = st.columns(4)
     with col1:
@@ -280,60 +310,65 @@ with tab1:
     # URL input
     url = st.text_input("🌐 Enter URL to shorten:", placeholder="https://example.com/very/long/url/that/needs/shortening", key="main_url")
     
-    col1, col2 = st.columns([3, 1])
+    col1, col2, col3 = st.columns([2, 1, 1])
     with col1:
-        show_qr = st.checkbox("📱 Generate QR Codes", value=True)
+        subcol1, subcol2 = st.columns([2, 1])
+        with subcol1:
+            show_qr = st.checkbox("📱 Generate QR Codes", value=True, help="QR codes are rendered when you open them on a card")
+        with subcol2:
+            qr_format = st.selectbox("QR format", ['PNG', 'SVG'], label_visibility="collapsed", disabled=not show_qr)
     with col2:
         test_links = st.checkbox("🔍 Test Links", value=True)
+    with col3:
+        fastest_only = st.checkbox("⚡ Fastest Link Only", value=False, help="Race the services and keep the first working link")
+    if fastest_only:
+        hedge_ms = st.slider("Hedge delay (ms):", 0, 2000, int(config.HEDGE_DELAY * 1000), step=50, help="Wait this long before starting each additional service; 0 starts them all at once")
     
     if st.button("🚀 Generate All Short Links", type="primary"):
-        if url and is_valid_url(url):
+        if url and is_valid_url(url) and fastest_only:
             st.session_state.stats['total_shortened'] += 1
             
-            services = {
-                'ShortURL.at': shorten_url_shorturlat,
-                'is.gd': shorten_url_isgd,
-                'v.gd': shorten_url_vgd,
-                'clck.ru': shorten_url_clckru,
-                'ulvis.net': shorten_url_ulvis
-            }
+            with st.spinner("Racing services for the fastest link..."):
+                result = race(url, SERVICES, hedge_delay=hedge_ms / 1000, test_links=test_links)
+            
+            if result:
+                st.session_state.stats['successful'] += 1
+                record_results(url, [result])
+                st.session_state.last_run = {'url': url, 'results': [result]}
+                render_result_card(result, url, show_qr, fastest=True, qr_format=qr_format)
+            else:
+                st.session_state.stats['failed'] += 1
+                st.error("❌ No service returned a working link")
+        elif url and is_valid_url(url):
+            st.session_state.stats['total_shortened'] += 1
             
             results = []
             progress_bar = st.progress(0)
             status_text = st.empty()
+            status_text.text(f"Shortening with {len(SERVICES)} services in parallel...")
+            cards = st.container()
             
-            for idx, (service_name, service_func) in enumerate(services.items()):
-                status_text.text(f"Shortening with {service_name}...")
-                short_url, elapsed, success = service_func(url)
-                
-                if success and short_url:
-                    # Test the link if enabled
-                    working = True
-                    redirect_url = url
-                    if test_links:
-                        working, redirect_url = test_short_url(short_url)
+            # Fan out every service (and its link test) at once and render each
+            # card as soon as it lands, so the wait is bounded by the slowest service
+            with ThreadPoolExecutor(max_workers=len(SERVICES)) as executor:
+                futures = [
+                    executor.submit(shorten_and_test, service_name, service_func, url, test_links)
+                    for service_name, service_func in SERVICES.items()
+                ]
+                for future in as_completed(futures):
+                    result = future.result()
+                    if result['success']:
+                        st.session_state.stats['successful'] += 1
+                    elif not result['skipped']:
+                        # A service skipped for its open circuit was never called
+                        st.session_state.stats['failed'] += 1
                     
-                    results.append({
-                        'service': service_name,
-                        'short_url': short_url,
-                        'elapsed': elapsed,
-                        'success': success,
-                        'working': working,
-                        'redirect_url': redirect_url
-                    })
-                    st.session_state.stats['successful'] += 1
-                else:
-                    results.append({
-                        'service': service_name,
-                        'short_url': None,
-                        'elapsed': elapsed,
-                        'success': False,
-                        'working': False,
-                        'redirect_url': None
-                    })
-                    st.session_state.stats['failed'] += 1
-                
-                progress_bar.progress((idx + 1) / len(services))
+                    with cards:
+                        render_result_card(result, url, show_qr, fastest=not any(r['success'] for r in results) and result['success'], qr_format=qr_format)
+                    results.append(result)
+                    
+                    progress_bar.progress(len(results) / len(SERVICES))
+                    status_text.text(f"{result['service']} done ({len(results)}/{len(SERVICES)})")
             
             status_text.empty()
             progress_bar.empty()
@@ -342,184 +377,325 @@ with tab1:
             results.sort(key=lambda x: x['elapsed'] if x['success'] else float('inf'))
             
             # Save to history
-            st.session_state.history.insert(0, {
-                'original_url': url,
-                'results': results,
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            })
+            record_results(url, results)
+            st.session_state.last_run = {'url': url, 'results': results}
             
-            # Display results
             st.success(f"✅ Generated {len([r for r in results if r['success']])} shortened links!")
             
-            for idx, result in enumerate(results):
-                if result['success']:
-                    with st.container():
-                        st.markdown(f"""
-                        <div class="link-card">
-                            <h3>🏆 {result['service']} {'⚡ FASTEST' if idx == 0 else ''}</h3>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        col1, col2 = st.columns([3, 1])
-                        
-                        with col1:
-                            st.code(result['short_url'], language=None)
-                            
-                            subcol1, subcol2, subcol3 = st.columns(3)
-                            with subcol1:
-                                st.markdown(f'<span class="success-badge">✓ Working</span>' if result['working'] else '<span class="failed-badge">✗ Failed Test</span>', unsafe_allow_html=True)
-                            with subcol2:
-                                st.markdown(f'<span class="speed-badge">⚡ {result["elapsed"]}ms</span>', unsafe_allow_html=True)
-                            with subcol3:
-                                if st.button(f"🔗 Test Link", key=f"test_{result['service']}"):
-                                    st.markdown(f"[Click to test]({result['short_url']})")
-                            
-                            if result['redirect_url'] and result['redirect_url'] != url:
-                                with st.expander("🔍 Redirect Chain"):
-                                    st.text(f"Final URL: {result['redirect_url']}")
-                        
-                        with col2:
-                            if show_qr:
-                                qr_img = generate_qr_code(result['short_url'])
-                                st.markdown(f'<img src="data:image/png;base64,{qr_img}" width="150"/>', unsafe_allow_html=True)
-                                st.markdown(f'<a href="data:image/png;base64,{qr_img}" download="{result["service"]}_qr.png">📥 Download QR</a>', unsafe_allow_html=True)
-                        
-                        st.markdown("</div>", unsafe_allow_html=True)
-                else:
-                    st.warning(f"❌ {result['service']} - Failed to generate link")
-            
             # Show original URL
             with st.expander("📝 Original URL"):
                 st.code(url)
         else:
             st.error("❌ Please enter a valid URL starting with http:// or https://")
+    elif 'last_run' in st.session_state:
+        # Keep the last results on screen across reruns (e.g. when a QR code is opened)
+        last_run = st.session_state.last_run
+        for idx, result in enumerate(last_run['results']):
+            render_result_card(result, last_run['url'], show_qr, fastest=idx == 0 and result['success'], qr_format=qr_format)
 
-with tab2:
+@st.fragment
+@profiler.timed("Analytics tab")
+def analytics_tab():
     st.header("📊 Performance Analytics")
     
-    if st.session_state.history:
-        # Collect all service performance data
-        service_stats = {}
-        
-        for entry in st.session_state.history:
-            for result in entry['results']:
-                service = result['service']
-                if service not in service_stats:
-                    service_stats[service] = {'successes': 0, 'failures': 0, 'total_time': 0, 'count': 0}
-                
-                if result['success']:
-                    service_stats[service]['successes'] += 1
-                    service_stats[service]['total_time'] += result['elapsed']
-                    service_stats[service]['count'] += 1
-                else:
-                    service_stats[service]['failures'] += 1
-        
-        # Create dataframe
-        df_data = []
-        for service, stats in service_stats.items():
-            avg_time = stats['total_time'] / max(stats['count'], 1)
-            success_rate = (stats['successes'] / max(stats['successes'] + stats['failures'], 1)) * 100
-            df_data.append({
-                'Service': service,
-                'Successes': stats['successes'],
-                'Failures': stats['failures'],
-                'Avg Speed (ms)': round(avg_time, 2),
-                'Success Rate (%)': round(success_rate, 1)
-            })
-        
-        df = pd.DataFrame(df_data)
-        df = df.sort_values('Avg Speed (ms)')
-        
-        st.dataframe(df, use_container_width=True)
+    rows = aggregates.rows()
+    if rows:
+        # Aggregates are kept up to date as results are recorded, so this is O(services)
+        st.dataframe(rows, use_container_width=True)
         
         # Best service recommendation
-        best_service = df.iloc[0]['Service']
+        best_service = rows[0]['Service']
         st.success(f"🏆 **Recommended Service:** {best_service} (Fastest average speed)")
     else:
         st.info("📊 No data yet. Shorten some URLs to see analytics!")
+    
+    if race_wins:
+        st.subheader("⚡ Fastest-Link Race Wins")
+        st.bar_chart({'Wins': dict(race_wins)})
+    
+    # Short-link cache effectiveness
+    st.subheader("💾 Link Cache")
+    cache_stats = link_cache.stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Cache Hits", cache_stats['hits'])
+    col2.metric("Cache Misses", cache_stats['misses'])
+    col3.metric("Hit Rate", f"{round(cache_stats['hits'] / max(cache_stats['hits'] + cache_stats['misses'], 1) * 100, 1)}%")
+    col4.metric("Cached Links", cache_stats['size'])
+    st.caption(
+        f"Served from memory: {cache_stats.get('memory_hits', 0)} • from Redis: {cache_stats.get('redis_hits', 0)} • "
+        f"duplicate in-flight requests coalesced: {cache_stats.get('coalesced', 0)}"
+    )
+    if config.ADMIN_UI and st.button("🧹 Clear Link Cache"):
+        # Wipes every tier for all sessions and processes, so only offered on admin deployments
+        link_cache.clear()
+        st.rerun()
+    
+    # Latency percentiles from the process-wide perf_counter_ns histograms
+    metrics = get_metrics()
+    if metrics.histograms:
+        st.subheader("⏱️ Latency Percentiles")
+        op = st.radio("Operation:", ['shorten', 'verify'], horizontal=True, format_func=str.title)
+        totals = metrics.summary(op)
+        if totals:
+            phase_means = {phase: metrics.summary(op, phase) for phase in PHASES[1:]}
+            latency_rows = [
+                {
+                    'Service': service,
+                    'Calls': s['count'],
+                    'p50 (ms)': round(s['p50_ms'], 1),
+                    'p95 (ms)': round(s['p95_ms'], 1),
+                    'p99 (ms)': round(s['p99_ms'], 1),
+                    **{f"{phase.upper()} avg (ms)": round(phase_means[phase].get(service, {}).get('mean_ms', 0), 1) for phase in PHASES[1:]}
+                }
+                for service, s in totals.items()
+            ]
+            st.dataframe(latency_rows, use_container_width=True)
+        else:
+            st.caption(f"No {op} calls recorded yet.")
+        st.download_button("📥 Export Prometheus Metrics", metrics.render_prometheus(), "ncra_metrics.prom", "text/plain")
+    
+    # Circuit breaker state per service, shared by every session
+    health = get_health().snapshot()
+    if health:
+        st.subheader("🩺 Service Health")
+        state_icons = {'closed': '🟢 Healthy', 'half-open': '🟡 Probing', 'open': '🔴 Down'}
+        health_rows = [
+            {
+                'Service': service,
+                'State': state_icons[h['state']],
+                'Calls (window)': h['calls'],
+                'Error Rate (%)': round(h['error_rate'] * 100, 1),
+                'Avg Latency (ms)': round(h['avg_latency_ms'], 2),
+                'Max Latency (ms)': round(h['max_latency_ms'], 2),
+                'Retry In (s)': round(h['retry_in_s'])
+            }
+            for service, h in health.items()
+        ]
+        st.dataframe(health_rows, use_container_width=True)
+    
+    # Keep-alive connection reuse across all sessions of this server process
+    pool_stats = http_pool.stats()
+    if pool_stats:
+        st.subheader("🔌 Connection Reuse")
+        pool_rows = [
+            {
+                'Host': host,
+                'Requests': s['requests'],
+                'Connections Opened': s['connections'],
+                'Reused': s['reused'],
+                'Reuse Rate (%)': round(s['reused'] / max(s['requests'], 1) * 100, 1)
+            }
+            for host, s in pool_stats.items()
+        ]
+        st.dataframe(pool_rows, use_container_width=True)
 
-with tab3:
+@st.fragment
+@profiler.timed("History tab")
+def history_tab():
     st.header("📜 Link History")
     
-    if st.session_state.history:
-        if st.button("🗑️ Clear History"):
-            st.session_state.history = []
-            st.rerun()
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        history_query = st.text_input("🔎 Filter by URL:", key="history_query")
+    with col2:
+        history_service = st.selectbox("Service:", ["All"] + list(SERVICES), key="history_service")
+    with col3:
+        page_size = st.selectbox("Per page:", [10, 25, 50, 100], key="history_page_size")
+    
+    # Only this session's runs are listed, exported, re-checked or cleared
+    filters = {
+        'owner': owner,
+        'service': None if history_service == "All" else history_service,
+        'url_contains': history_query or None
+    }
+    total_runs = history_store.count_runs(**filters)
+    
+    if total_runs:
+        pages = (total_runs - 1) // page_size + 1
+        page = st.number_input(f"Page (of {pages}):", min_value=1, max_value=pages, value=1, key="history_page")
+        st.caption(f"{total_runs:,} shortening runs")
         
-        for entry in st.session_state.history[:10]:  # Show last 10
+        for entry in history_store.page(offset=(page - 1) * page_size, limit=page_size, **filters):
             with st.expander(f"🔗 {entry['original_url'][:50]}... - {entry['timestamp']}"):
                 st.text(f"Original: {entry['original_url']}")
                 st.markdown("**Shortened URLs:**")
                 for result in entry['results']:
                     if result['success']:
-                        st.text(f"• {result['service']}: {result['short_url']} ({result['elapsed']}ms)")
+                        st.text(f"• {result['service']}: {result['short_url']} ({result['elapsed']}ms){'' if result['working'] else ' ✗ broken'}")
         
-        # Export option
-        if st.button("📥 Export History as CSV"):
-            export_data = []
-            for entry in st.session_state.history:
-                for result in entry['results']:
-                    if result['success']:
-                        export_data.append({
-                            'Original URL': entry['original_url'],
-                            'Service': result['service'],
-                            'Short URL': result['short_url'],
-                            'Speed (ms)': result['elapsed'],
-                            'Timestamp': entry['timestamp']
-                        })
-            
-            df_export = pd.DataFrame(export_data)
-            csv = df_export.to_csv(index=False)
-            st.download_button("Download CSV", csv, "link_history.csv", "text/csv")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            # Export option: rows are streamed from SQLite into a file chunk by chunk
+            export_format = st.selectbox("Export format:", export_formats(), format_func=str.upper, key="history_export_format")
+            if st.button("📥 Export History"):
+                # A directory per request, so concurrent exports never share a file; the
+                # download button has read it by the time it is removed
+                with tempfile.TemporaryDirectory(prefix='ncra-export-') as export_dir:
+                    export_path = write_export(history_store.iter_results(**filters), EXPORT_FIELDS,
+                                               os.path.join(export_dir, f"link_history.{export_format}"), export_format)
+                    with open(export_path, 'rb') as f:
+                        st.download_button(f"Download {export_format.upper()}", f, f"link_history.{export_format}", EXPORT_FORMATS[export_format])
+        with col2:
+            if st.button("🔁 Re-check Links", help="Verify every stored link again, following its redirect chain"):
+                progress_text = st.empty()
+                checked = broken = 0
+                for result in revalidate_history(history_store, service=filters['service'], owner=owner):
+                    checked += 1
+                    broken += not result['working']
+                    progress_text.text(f"Checked {checked:,} links • {broken:,} broken")
+                st.success(f"✅ Re-checked {checked:,} links: {checked - broken:,} working, {broken:,} broken")
+        with col3:
+            if st.button("🗑️ Clear History"):
+                # The service aggregates are server-wide, so they keep these results
+                history_store.clear(owner)
+                st.rerun()
     else:
         st.info("📜 No history yet. Start shortening URLs!")
 
-with tab4:
+@st.fragment
+@profiler.timed("Batch tab")
+def batch_tab():
     st.header("⚙️ Batch URL Processing")
-    st.write("Shorten multiple URLs at once!")
-    
-    batch_urls = st.text_area("Enter URLs (one per line):", height=200, placeholder="https://example.com/url1\nhttps://example.com/url2\nhttps://example.com/url3")
+    st.write("Shorten multiple URLs at once! Batches run in the background, so you can keep using the app.")
     
-    batch_service = st.selectbox("Choose service for batch:", ['ShortURL.at', 'is.gd', 'v.gd', 'clck.ru', 'ulvis.net'])
+    input_mode = st.radio("Input:", ["✍️ Paste URLs", "📂 Upload File (CSV/TXT)"], horizontal=True)
+    if input_mode == "✍️ Paste URLs":
+        batch_urls = st.text_area("Enter URLs (one per line):", height=200, placeholder="https://example.com/url1\nhttps://example.com/url2\nhttps://example.com/url3")
+    else:
+        batch_file = st.file_uploader("Upload a TXT file (one URL per line) or a CSV with a URL column:", type=['txt', 'csv'])
+    
+    batch_service = st.selectbox("Choose service for batch:", [DISTRIBUTE] + list(SERVICES), index=1, help="Distribute spreads URLs over every service, weighted by observed speed and success rate")
+    batch_workers = st.slider("Parallel workers:", 1, 32, config.BATCH_WORKERS, help="Requests are still paced by each service's rate limit")
+    
+    if input_mode == "📂 Upload File (CSV/TXT)":
+        if batch_file is not None and st.button("🚀 Process File"):
+            # The job id is derived from the file, service and session, so re-uploading the
+            # same file shows (or resumes) this session's job instead of starting over
+            job_id = f"{file_digest(batch_file)[:16]}_{hashlib.sha1(f'{batch_service}{owner}'.encode()).hexdigest()[:8]}"
+            job_queue.submit(batch_file, batch_file.name, batch_service, workers=batch_workers, job_id=job_id, owner=owner)
+            # Full rerun so the job list picks up the new job and starts polling
+            st.rerun()
     
-    if st.button("🚀 Process Batch"):
-        urls = [url.strip() for url in batch_urls.split('\n') if url.strip()]
-        valid_urls = [url for url in urls if is_valid_url(url)]
-        
+    elif st.button("🚀 Process Batch"):
+        valid_urls = [url.strip() for url in batch_urls.split('\n') if is_valid_url(url.strip())]
         if valid_urls:
-            service_map = {
-                'ShortURL.at': shorten_url_shorturlat,
-                'is.gd': shorten_url_isgd,
-                'v.gd': shorten_url_vgd,
-                'clck.ru': shorten_url_clckru,
-                'ulvis.net': shorten_url_ulvis
-            }
-            
-            service_func = service_map[batch_service]
-            progress = st.progress(0)
-            results_container = st.container()
-            
-            batch_results = []
-            for idx, url in enumerate(valid_urls):
-                short_url, elapsed, success = service_func(url)
-                batch_results.append({
-                    'original': url,
-                    'short': short_url if success else 'Failed',
-                    'success': success
-                })
-                progress.progress((idx + 1) / len(valid_urls))
-                time.sleep(0.5)  # Rate limiting
-            
-            with results_container:
-                df_batch = pd.DataFrame(batch_results)
-                st.dataframe(df_batch, use_container_width=True)
-                
-                # Download results
-                csv_batch = df_batch.to_csv(index=False)
-                st.download_button("📥 Download Results", csv_batch, "batch_results.csv", "text/csv")
+            job_queue.submit(io.BytesIO('\n'.join(valid_urls).encode()), "pasted.txt", batch_service, workers=batch_workers, owner=owner)
+            st.rerun()
         else:
             st.error("❌ No valid URLs found!")
 
+def export_formats():
+    return [fmt for fmt in EXPORT_FORMATS if fmt != 'parquet' or parquet_available()]
+
+@st.cache_data(max_entries=32)
+def job_service_counts(out_path, updated_at):
+    """URLs per service in a finished job's results, counted in one streaming pass"""
+    service_column = BATCH_FIELDS.index('service')
+    return {'URLs': dict(collections.Counter(row[service_column] for row in iter_csv_rows(out_path) if row[service_column]))}
+
+def job_export(job, fmt):
+    """A finished job's results in fmt, converted by streaming once and then reused"""
+    _, out_path, _ = job_queue.paths(job['id'])
+    if fmt == 'csv':
+        return out_path
+    export_path = f"{os.path.splitext(out_path)[0]}.{fmt}"
+    if not os.path.exists(export_path) or os.path.getmtime(export_path) < os.path.getmtime(out_path):
+        write_export(iter_result_rows(out_path), BATCH_FIELDS, export_path, fmt)
+    return export_path
+
+def job_qr_sheet(job):
+    """A finished job's QR sheet, streamed to a file next to its results once and then reused"""
+    _, out_path, _ = job_queue.paths(job['id'])
+    sheet_path = os.path.join(job_queue.directory, f"{job['id']}.qr.zip")
+    if not os.path.exists(sheet_path):
+        build_qr_sheet(((short_url.split('://', 1)[-1], short_url) for _, short_url in iter_successful_links(out_path)), sheet_path)
+    return sheet_path
+
+def prepared_download(key, prepare_label, download_label, build, file_name, mime, spinner="Preparing download..."):
+    """A button that builds a file on request, then a one-shot download button for it.
+
+    st.download_button reads its whole file on every run that shows it (every poll, in the
+    jobs fragment), so nothing is built or read until asked for and the button goes once used.
+    """
+    path = st.session_state.get(key)
+    if path and os.path.exists(path):
+        with open(path, 'rb') as f:
+            st.download_button(download_label, f, file_name, mime, key=f"download_{key}",
+                               on_click=st.session_state.pop, args=(key, None))
+    elif st.button(prepare_label, key=f"prepare_{key}"):
+        with st.spinner(spinner):
+            st.session_state[key] = build()
+        st.rerun(scope="fragment")
+
+@profiler.timed("Batch jobs")
+def render_jobs(polling):
+    """Progress and partial results of this session's recent jobs.
+
+    Reruns on its own every 2s while a job is active and every 30s otherwise, to notice jobs
+    started from another tab. run_every is fixed when the fragment is created, so once the
+    active state no longer matches polling a full rerun recreates it.
+    """
+    if polling != bool(job_queue.jobs(statuses=ACTIVE, owner=owner)):
+        st.rerun()
+    jobs = job_queue.jobs(limit=10, owner=owner)
+    if not jobs:
+        return
+    st.subheader("📋 Batch Jobs")
+    for job in reversed(jobs):
+        _, out_path, _ = job_queue.paths(job['id'])
+        active = job['status'] in ACTIVE
+        icon = {'queued': '⏳', 'running': '🔄', 'done': '✅', 'failed': '❌', 'cancelled': '⏹️'}[job['status']]
+        with st.expander(f"{icon} {job['name']} • {job['service']} • {job['status']}", expanded=active):
+            st.progress(job['progress'])
+            st.text(f"{job['rows_done']:,} rows • {job['succeeded']:,} shortened • {job['failed']:,} failed • {job['updated_at'] - job['created_at']:.0f}s")
+            if job['error']:
+                st.error(job['error'])
+            if os.path.exists(out_path) and os.path.getsize(out_path):
+                # Rows are appended chunk by chunk, so this is a live view while the job runs;
+                # only the requested page is read from disk
+                page_size = 100
+                pages = max((job['succeeded'] + job['failed'] - 1) // page_size + 1, 1)
+                page = st.number_input(f"Page (of {pages}):", min_value=1, max_value=pages, value=1, key=f"page_{job['id']}")
+                st.dataframe([dict(zip(BATCH_FIELDS, row)) for row in read_page(out_path, (page - 1) * page_size, page_size)],
+                             use_container_width=True, hide_index=True)
+                if job['status'] == 'done':
+                    if job['service'] == DISTRIBUTE:
+                        st.markdown("**URLs per service:**")
+                        st.bar_chart(job_service_counts(out_path, job['updated_at']))
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        fmt = st.selectbox("Format:", export_formats(), format_func=str.upper, key=f"format_{job['id']}")
+                        prepared_download(f"export_{job['id']}_{fmt}", "📦 Prepare Results", "📥 Download Results",
+                                          lambda: job_export(job, fmt), f"batch_results_{job['id']}.{fmt}", EXPORT_FORMATS[fmt])
+                    with col2:
+                        prepared_download(f"qr_sheet_{job['id']}", "📱 Build QR Sheet", "📱 Download QR Sheet",
+                                          lambda: job_qr_sheet(job), f"qr_sheet_{job['id']}.zip", "application/zip",
+                                          spinner="Rendering QR codes...")
+                    with col3:
+                        if st.button("🗑️ Remove", key=f"remove_{job['id']}"):
+                            job_queue.delete(job['id'])
+                            st.rerun(scope="fragment")
+            if active and st.button("⏹️ Cancel", key=f"cancel_{job['id']}"):
+                job_queue.cancel(job['id'])
+                st.rerun(scope="fragment")
+            elif job['status'] in ('failed', 'cancelled') and st.button("🗑️ Remove", key=f"remove_{job['id']}"):
+                job_queue.delete(job['id'])
+                st.rerun(scope="fragment")
+
+# Main tabs
+tab1, tab2, tab3, tab4 = st.tabs(["🚀 Shorten URLs", "📊 Analytics", "📜 History", "⚙️ Batch Processing"])
+with tab1:
+    shorten_tab()
+with tab2:
+    analytics_tab()
+with tab3:
+    history_tab()
+with tab4:
+    batch_tab()
+    # Poll quickly only while something is running; the job table lives outside the session
+    jobs_active = bool(job_queue.jobs(statuses=ACTIVE, owner=owner))
+    st.fragment(render_jobs, run_every=2 if jobs_active else 30)(jobs_active)
+
 # Sidebar
 with st.sidebar:
     st.header("ℹ️ About Link Shortener Pro")
@@ -557,6 +733,10 @@ with st.sidebar:
     
     st.markdown("---")
     st.info("💡 **Pro Tip:** The fastest service changes based on your location and current server load!")
+    
+    with st.expander("⏱️ Rerun Timing"):
+        st.caption("Whole-script runs and tab fragment reruns, across all sessions")
+        st.dataframe(profiler.rows(), use_container_width=True, hide_index=True)
 
 # Footer
 st.markdown("---")
@@ -567,3 +747,13 @@ st.markdown("""
     <p>💼 Professional tool by NCRA-CMS Lab</p>
 </div>
 """, unsafe_allow_html=True)
+
+# Whole-script time: the process's first run includes the cold imports
+run_ns = time.perf_counter_ns() - run_started
+if 'Cold start' not in profiler.sections:
+    profiler.record('Cold start', run_ns)
+elif 'rendered' not in st.session_state:
+    profiler.record('First render', run_ns)
+else:
+    profiler.record('Full rerun', run_ns)
+st.session_state.rendered = True
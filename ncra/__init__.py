@@ -0,0 +1,7 @@
+"""NCRA Link Shortener engine.
+
+Everything here is importable without Streamlit; app.py is only the UI.
+Submodules are imported on demand so the CLI starts fast.
+"""
+
+__version__ = '0.1.0'
@@ -0,0 +1,71 @@
+"""Running per-service aggregates, updated as each result is recorded"""
+import threading
+
+from .history import get_history_store
+from .metrics import LatencyHistogram
+from .util import singleton
+
+
+class ServiceAggregates:
+    """Success/failure counts, latency sum and a quantile sketch per service.
+
+    Updating is O(1) per result and reading is O(number of services), independent of
+    how much history has been recorded.
+    """
+
+    def __init__(self):
+        self.services = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.services = {}
+
+    def record(self, result):
+        with self._lock:
+            self._record(result)
+
+    def _record(self, result):
+        stats = self.services.get(result['service'])
+        if stats is None:
+            stats = self.services[result['service']] = {
+                'successes': 0, 'failures': 0, 'total_time': 0.0, 'count': 0, 'sketch': LatencyHistogram()
+            }
+        if result['success']:
+            stats['successes'] += 1
+            # Cache hits say nothing about the service's own speed
+            if not result.get('cached'):
+                stats['total_time'] += result['elapsed']
+                stats['count'] += 1
+                stats['sketch'].record(result['elapsed'] * 1e6)
+        else:
+            stats['failures'] += 1
+
+    def rows(self):
+        """One summary dict per service, fastest average first"""
+        rows = []
+        with self._lock:
+            services = list(self.services.items())
+        for service, stats in services:
+            attempts = stats['successes'] + stats['failures']
+            rows.append({
+                'Service': service,
+                'Successes': stats['successes'],
+                'Failures': stats['failures'],
+                'Avg Speed (ms)': round(stats['total_time'] / max(stats['count'], 1), 2),
+                'p50 (ms)': round(stats['sketch'].quantile(0.5) / 1e6, 2),
+                'p95 (ms)': round(stats['sketch'].quantile(0.95) / 1e6, 2),
+                'Success Rate (%)': round(stats['successes'] / max(attempts, 1) * 100, 1)
+            })
+        # Services with no timed success yet go last rather than looking fastest at 0ms
+        rows.sort(key=lambda row: (row['Successes'] == 0, row['Avg Speed (ms)']))
+        return rows
+
+
+@singleton
+def get_aggregates():
+    """Process-wide aggregates, rebuilt once from the persistent history on first use"""
+    aggregates = ServiceAggregates()
+    for service, success, elapsed, cached in get_history_store().iter_service_results():
+        aggregates.record({'service': service, 'success': success, 'elapsed': elapsed or 0, 'cached': cached})
+    return aggregates
@@ -0,0 +1,254 @@
+"""Rate-limited, load-balanced batch shortening and streaming file batches"""
+import csv
+import hashlib
+import io
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import config
+from .cache import get_link_cache
+from .engine import race
+from .health import call_service, get_health
+from .pool import get_session_pool
+from .ratelimit import get_rate_limiters, get_scoreboard
+from .shared import MemoryCache, get_singleflight
+from .urls import canonical_key, canonicalize_url, is_valid_url
+
+DISTRIBUTE = '🔀 Distribute across all'
+FASTEST = '⚡ Fastest wins'
+BATCH_FIELDS = ['row', 'original', 'short', 'service', 'success']
+
+
+def _wait_for_circuit(breaker, deadline):
+    """Sleep until breaker lets calls through again; False if deadline (monotonic) comes first"""
+    while not breaker.available():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        # retry_in_s is 0 while a half-open probe is in flight, so poll until it lands
+        time.sleep(min(max(breaker.snapshot()['retry_in_s'], 0.05), remaining))
+    return True
+
+
+def batch_shorten(service_name, service_func, long_url, max_attempts=None, wait_for_circuit=False):
+    """Shorten one batch URL under the service's rate limit, backing off on 429/5xx.
+
+    Like cached_shorten, equivalent spellings share the cache entry and call, and the service
+    is sent the URL as entered. While the service's circuit is open the URL fails at once,
+    unless wait_for_circuit, in which case it waits (up to BATCH_CIRCUIT_WAIT seconds) for
+    the circuit to let calls through again; waits do not use up attempts.
+    """
+    link_cache = get_link_cache()
+    short_url = link_cache.get(service_name, long_url)
+    if short_url:
+        return short_url, True, True
+
+    def attempt():
+        http_pool = get_session_pool()
+        scoreboard = get_scoreboard()
+        bucket = get_rate_limiters()[service_name]
+        breaker = get_health().breaker(service_name)
+        deadline = time.monotonic() + config.BATCH_CIRCUIT_WAIT
+        attempts = 0
+        while attempts < (max_attempts or config.BATCH_MAX_ATTEMPTS):
+            if not breaker.available() and not (wait_for_circuit and _wait_for_circuit(breaker, deadline)):
+                break
+            bucket.acquire()
+            http_pool.reset_last_response()
+            # Every retry goes back through the bucket, so the session must not retry 5xx on its own
+            with http_pool.status_retries_disabled():
+                outcome = call_service(service_name, service_func, long_url)
+            if outcome is None:
+                # Circuit opened, or another worker holds the half-open probe: wait again, or
+                # fail fast instead of waiting out the service's timeout
+                if wait_for_circuit:
+                    continue
+                break
+            attempts += 1
+            short_url, elapsed, success = outcome
+            scoreboard.record(service_name, bool(success and short_url), elapsed)
+            if success and short_url:
+                bucket.on_success()
+                link_cache.put(service_name, long_url, short_url)
+                return short_url
+            status, retry_after = http_pool.last_response()
+            # Any other 4xx is a permanent rejection of this URL, not a capacity problem
+            if status is not None and status != 429 and status < 500:
+                break
+            bucket.on_throttle(retry_after)
+        return None
+
+    # Duplicate URLs in flight (in this batch or another session) share one upstream call; keyed
+    # apart from cached_shorten's flights, which return (short_url, elapsed, success) instead
+    short_url, shared = get_singleflight().do(('batch', service_name, canonicalize_url(long_url)), attempt)
+    return short_url, short_url is not None, shared
+
+
+def distribute_shorten(service_map, long_url):
+    """Pick a service weighted by observed speed/reliability, failing over to the next best"""
+    scoreboard = get_scoreboard()
+    candidates = get_health().available(service_map) or list(service_map)
+    first = scoreboard.choose(candidates)
+    for service_name in [first] + [s for s in scoreboard.ranked(candidates) if s != first]:
+        short_url, success, cached = batch_shorten(service_name, service_map[service_name], long_url, max_attempts=2)
+        if success:
+            return service_name, short_url, True
+    return None, None, False
+
+
+def batch_task(service_name, service_map, long_url):
+    if service_name == DISTRIBUTE:
+        return distribute_shorten(service_map, long_url)
+    if service_name == FASTEST:
+        result = race(long_url, service_map, hedge_delay=config.HEDGE_DELAY, test_links=False)
+        return (result['service'], result['short_url'], True) if result else (None, None, False)
+    # With a single service there is nothing to fail over to, so ride out its open circuit
+    short_url, success, cached = batch_shorten(service_name, service_map[service_name], long_url, wait_for_circuit=True)
+    return service_name, short_url, success
+
+
+def run_tasks(tasks, service_map, max_workers=None):
+    """Run (service_name, url) tasks on a bounded worker pool, yielding (index, service, short_url, success).
+
+    Tasks for the same service and canonical URL run once with the first such task's URL as
+    entered; the result is yielded for each index.
+    """
+    groups = {}
+    for idx, (service_name, url) in enumerate(tasks):
+        groups.setdefault((service_name, canonical_key(url)), []).append(idx)
+    with ThreadPoolExecutor(max_workers=max_workers or config.BATCH_WORKERS) as executor:
+        futures = {
+            executor.submit(batch_task, service_name, service_map, tasks[indexes[0]][1]): indexes
+            for (service_name, _), indexes in groups.items()
+        }
+        for future in as_completed(futures):
+            service, short_url, success = future.result()
+            for idx in futures[future]:
+                yield idx, service, short_url, success
+
+
+def run_batch(urls, service_name, service_map, max_workers=None):
+    """Shorten urls on a bounded worker pool, yielding (index, service, short_url, success) as they finish"""
+    return run_tasks([(service_name, url) for url in urls], service_map, max_workers)
+
+
+# Streaming file-based batches with crash-safe checkpoints
+
+def iter_input_urls(binary_stream, filename=''):
+    """Lazily yield one candidate URL per input row of a TXT or CSV file"""
+    text = io.TextIOWrapper(binary_stream, encoding='utf-8', errors='replace', newline='')
+    try:
+        if filename.lower().endswith('.csv'):
+            for row in csv.reader(text):
+                # Take the first cell that looks like a URL so header rows and extra columns are skipped
+                yield next((cell.strip() for cell in row if is_valid_url(cell.strip())), '')
+        else:
+            for line in text:
+                yield line.strip()
+    finally:
+        # Leave the caller's stream open
+        text.detach()
+
+
+def file_digest(binary_stream):
+    digest = hashlib.sha256()
+    for block in iter(lambda: binary_stream.read(1 << 20), b''):
+        digest.update(block)
+    binary_stream.seek(0)
+    return digest.hexdigest()
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'rows_done': 0, 'out_offset': 0, 'succeeded': 0, 'failed': 0, 'finished': False}
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def process_stream(urls, service_names, service_map, out_path, checkpoint_path,
+                   chunk_size=None, max_workers=None, out_format='csv'):
+    """Shorten an iterable of URLs chunk by chunk, appending rows to out_path.
+
+    Every URL is shortened once per entry of service_names (DISTRIBUTE and FASTEST count as one).
+    Rows are written as CSV or JSONL. Resumes from checkpoint_path if present and
+    yields the checkpoint after every chunk. Duplicates of a URL already shortened in this run
+    (by canonical form) reuse its result instead of going back to the service.
+    """
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint['finished']:
+        yield checkpoint
+        return
+    rows = itertools.islice(enumerate(urls), checkpoint['rows_done'], None)
+    dedup_index = MemoryCache(max_entries=config.DEDUP_INDEX_SIZE, ttl=float('inf'))
+    
+    with open(out_path, 'a+', newline='', encoding='utf-8') as out:
+        # Drop anything written after the last checkpoint so rows are never duplicated
+        out.truncate(checkpoint['out_offset'])
+        out.seek(checkpoint['out_offset'])
+        if out_format == 'jsonl':
+            def write_row(values):
+                out.write(json.dumps(dict(zip(BATCH_FIELDS, values))) + '\n')
+        else:
+            writer = csv.writer(out)
+            write_row = writer.writerow
+            if checkpoint['out_offset'] == 0:
+                writer.writerow(BATCH_FIELDS)
+        
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size or config.BATCH_CHUNK_SIZE))
+            if not chunk:
+                break
+            tasks = [(row, url, service_name) for row, url in chunk if is_valid_url(url) for service_name in service_names]
+            keys = [(service_name, canonical_key(url)) for _, url, service_name in tasks]
+            chunk_results = [dedup_index.get(key) for key in keys]
+            pending = [idx for idx, result in enumerate(chunk_results) if result is None]
+            for idx, service, short_url, success in run_tasks([(tasks[i][2], tasks[i][1]) for i in pending], service_map, max_workers):
+                chunk_results[pending[idx]] = (service, short_url, success)
+                if success:
+                    dedup_index.put(keys[pending[idx]], (service, short_url, success))
+            for (row, url, _), (service, short_url, success) in zip(tasks, chunk_results):
+                write_row([row, url, short_url if success else 'Failed', service or '', success])
+                checkpoint['succeeded' if success else 'failed'] += 1
+            out.flush()
+            os.fsync(out.fileno())
+            
+            checkpoint['rows_done'] = chunk[-1][0] + 1
+            checkpoint['out_offset'] = out.tell()
+            save_checkpoint(checkpoint_path, checkpoint)
+            yield checkpoint
+    
+    checkpoint['finished'] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+    yield checkpoint
+
+
+def iter_result_rows(out_path):
+    """Yield typed (row, original, short, service, success) tuples from a process_stream output file"""
+    with open(out_path, newline='', encoding='utf-8') as f:
+        if out_path.endswith('.jsonl'):
+            for line in f:
+                record = json.loads(line)
+                yield tuple(record[field] for field in BATCH_FIELDS)
+        else:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row, original, short, service, success in reader:
+                yield int(row), original, short, service, success == 'True'
+
+
+def iter_successful_links(out_path):
+    """Yield (original, short) for each successful row of a process_stream output file"""
+    for _, original, short, _, success in iter_result_rows(out_path):
+        if success:
+            yield original, short
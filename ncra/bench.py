@@ -0,0 +1,377 @@
+"""Repeatable load benchmark against local stand-ins for the public shortener APIs: ncra-bench --urls 500"""
+import argparse
+import json
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from . import config
+
+# How each public API is called: (method, path, where the long URL goes)
+MOCK_APIS = {
+    'ShortURL.at': ('POST', '/shortener.php', 'form'),
+    'is.gd': ('GET', '/create.php', 'query'),
+    'v.gd': ('GET', '/create.php', 'query'),
+    'clck.ru': ('POST', '/--', 'form'),
+    'ulvis.net': ('GET', '/api.php', 'query')
+}
+SCENARIOS = ('single', 'batch', 'verify')
+
+
+class _FarmServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog of 5 drops SYNs under load, which shows up as second-long tails
+    request_queue_size = 1024
+
+
+class MockShortener:
+    """Threaded HTTP server mimicking one shortener API, plus its redirects and landing pages.
+
+    latency_ms is the mean of an exponential delay per request, error_rate the share of 500s,
+    and above capacity_rps requests per second it answers 429 with Retry-After.
+    """
+
+    def __init__(self, name, latency_ms=50, error_rate=0.0, capacity_rps=0, seed=0):
+        self.name = name
+        self.method, self.path, self.url_in = MOCK_APIS[name]
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.capacity_rps = capacity_rps
+        self.random = random.Random(seed)
+        self.links = {}
+        self.counts = {'shorten': 0, 'redirect': 0, 'errors': 0, 'throttled': 0}
+        self._window = [0.0, 0]
+        self._lock = threading.Lock()
+        self.server = _FarmServer(('127.0.0.1', 0), self._handler_class())
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name=f"mock-{self.name}", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def endpoint(self):
+        return self.base_url + self.path
+
+    def _admit(self):
+        """None to serve the request, or the status to fail it with"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window[0] >= 1:
+                self._window = [now, 0]
+            self._window[1] += 1
+            if self.capacity_rps and self._window[1] > self.capacity_rps:
+                self.counts['throttled'] += 1
+                return 429
+            if self.random.random() < self.error_rate:
+                self.counts['errors'] += 1
+                return 500
+            delay = self.random.expovariate(1000 / self.latency_ms) if self.latency_ms else 0
+        time.sleep(delay)
+        return None
+
+    def _shorten(self, long_url):
+        with self._lock:
+            self.counts['shorten'] += 1
+            code = f"{len(self.links):x}"
+            self.links[code] = long_url
+        return f"{self.base_url}/s/{code}"
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; Nagle would hold the body back
+            disable_nagle_algorithm = True
+
+            def _reply(self, status, body=b'', headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+
+            def _handle(self):
+                parts = urlsplit(self.path)
+                # Always drain the body so the kept-alive connection stays in sync
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode()
+                if parts.path.startswith('/s/'):
+                    long_url = mock.links.get(parts.path[3:])
+                    with mock._lock:
+                        mock.counts['redirect'] += 1
+                    return self._reply(301, headers=[('Location', long_url)]) if long_url else self._reply(404)
+                if parts.path.startswith('/landing/'):
+                    return self._reply(200, b'ok', [('Content-Type', 'text/plain')])
+                if parts.path != mock.path or self.command != mock.method:
+                    return self._reply(404)
+                fields = parse_qs(body if mock.url_in == 'form' else parts.query)
+                status = mock._admit()
+                if status == 429:
+                    return self._reply(429, headers=[('Retry-After', '1')])
+                if status:
+                    return self._reply(status)
+                long_url = (fields.get('url') or [''])[0]
+                if not long_url:
+                    return self._reply(400, b'Error: missing url')
+                self._reply(200, mock._shorten(long_url).encode(), [('Content-Type', 'text/plain')])
+
+            do_GET = do_POST = do_HEAD = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def start_farm(latency_ms=50, error_rate=0.0, capacity_rps=0, seed=0):
+    """Start one mock server per public provider and point the registered adapters at them"""
+    from .providers import SERVICES
+
+    farm = {}
+    for offset, name in enumerate(MOCK_APIS):
+        mock = farm[name] = MockShortener(name, latency_ms, error_rate, capacity_rps, seed + offset).start()
+        SERVICES[name].configure(endpoint=mock.endpoint)
+    return farm
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _percentiles(histogram):
+    return {
+        'p50_ms': round(histogram.quantile(0.5) / 1e6, 2),
+        'p95_ms': round(histogram.quantile(0.95) / 1e6, 2),
+        'p99_ms': round(histogram.quantile(0.99) / 1e6, 2),
+        'max_ms': round(histogram.max_ns / 1e6, 2)
+    }
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+
+def run_single(urls, workers, services, test_links=True):
+    """The Shorten tab: every service (and its link test) for each URL, several URLs at once"""
+    from .engine import shorten_and_test
+    from .metrics import LatencyHistogram
+
+    histogram = LatencyHistogram()
+    ok = failed = 0
+
+    def fan_out(url):
+        start = time.perf_counter_ns()
+        with ThreadPoolExecutor(max_workers=len(services)) as executor:
+            results = list(executor.map(lambda name: shorten_and_test(name, services[name], url, test_links), services))
+        histogram.record(time.perf_counter_ns() - start)
+        return results
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in as_completed([executor.submit(fan_out, url) for url in urls]):
+            for result in future.result():
+                if result['success'] and result['working']:
+                    ok += 1
+                else:
+                    failed += 1
+    return histogram, ok, failed
+
+
+def run_batch_scenario(urls, workers, services):
+    """The Batch tab: URLs distributed across services under their rate limits"""
+    from .batch import DISTRIBUTE, run_batch
+    from .metrics import LatencyHistogram, get_metrics
+
+    ok = failed = 0
+    short_urls = []
+    for _, _, short_url, success in run_batch(urls, DISTRIBUTE, services, max_workers=workers):
+        ok += bool(success)
+        failed += not success
+        if short_url:
+            short_urls.append(short_url)
+    # Per provider call latency, merged over services
+    histogram = LatencyHistogram()
+    metrics = get_metrics()
+    for (service, op, phase), service_histogram in list(metrics.histograms.items()):
+        if op == 'shorten' and phase == 'total':
+            for index, count in service_histogram.buckets.items():
+                histogram.buckets[index] = histogram.buckets.get(index, 0) + count
+            histogram.count += service_histogram.count
+            histogram.sum_ns += service_histogram.sum_ns
+            histogram.max_ns = max(histogram.max_ns, service_histogram.max_ns)
+    return histogram, ok, failed, short_urls
+
+
+def run_verify(short_urls, workers):
+    """Bulk verification of issued links"""
+    from .metrics import LatencyHistogram
+    from .verify import verify_many
+
+    histogram = LatencyHistogram()
+    ok = failed = 0
+    for result in verify_many(short_urls, max_workers=workers):
+        histogram.record(result['elapsed'] * 1e6)
+        ok += result['working']
+        failed += not result['working']
+    return histogram, ok, failed
+
+
+def run_benchmark(url_count=200, scenarios=SCENARIOS, workers=16, latency_ms=50, error_rate=0.0,
+                  capacity_rps=0, provider_rps=1000.0, seed=0, trace_memory=False):
+    """Run the scenarios against a fresh mock farm and data directory; returns the report dict"""
+    from .metrics import get_metrics
+    from .providers import SERVICES, LocalProvider
+    from .redirect import start_redirect_server
+
+    random.seed(seed)
+    # A throwaway data directory and no caches, so every run does the same work
+    config.DATA_DIR = tempfile.mkdtemp(prefix='ncra-bench-')
+    config.CACHE_ENABLED = False
+    config.VERIFY_TTL = 0
+    redirect_port = _free_port()
+    config.LOCAL_BASE_URL = f"http://127.0.0.1:{redirect_port}"
+    start_redirect_server(redirect_port, host='127.0.0.1')
+    # The farm's providers only: an in-process provider would soak up the batch and never be throttled
+    farm_services = {name: SERVICES[name] for name in MOCK_APIS}
+    # Issues the links for verifying on its own, without joining the farm services
+    local = LocalProvider('NCRA Local', rate_limit=1000.0)
+    for provider in SERVICES.values():
+        provider.rate_limit = provider_rps
+    farm = start_farm(latency_ms, error_rate, capacity_rps, seed)
+    landing = next(iter(farm.values())).base_url
+    urls = [f"{landing}/landing/{i}?ref={seed}" for i in range(url_count)]
+
+    report = {
+        'settings': {'urls': url_count, 'workers': workers, 'latency_ms': latency_ms, 'error_rate': error_rate,
+                     'capacity_rps': capacity_rps, 'provider_rps': provider_rps, 'seed': seed},
+        'scenarios': {}
+    }
+    short_urls = []
+    try:
+        for scenario in scenarios:
+            get_metrics.cache_clear()
+            if trace_memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            if scenario == 'single':
+                histogram, ok, failed = run_single(urls, workers, farm_services)
+                units = url_count
+            elif scenario == 'batch':
+                histogram, ok, failed, short_urls = run_batch_scenario(urls, workers, farm_services)
+                units = url_count
+            elif scenario == 'verify':
+                if not short_urls:
+                    # Verifying on its own: issue links with the built-in provider first (untimed)
+                    short_urls = [local(url)[0] for url in urls]
+                    start = time.perf_counter()
+                histogram, ok, failed = run_verify(short_urls, workers)
+                units = ok + failed
+            else:
+                raise ValueError(f"unknown scenario {scenario!r} (choose from {', '.join(SCENARIOS)})")
+            seconds = time.perf_counter() - start
+            row = {
+                'seconds': round(seconds, 3),
+                'throughput_per_s': round(units / seconds, 1) if seconds else 0,
+                'ok': ok,
+                'failed': failed,
+                **_percentiles(histogram)
+            }
+            if trace_memory:
+                row['heap_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1 << 20), 1)
+                tracemalloc.stop()
+            report['scenarios'][scenario] = row
+    finally:
+        for mock in farm.values():
+            mock.stop()
+    report['peak_rss_mb'] = _peak_rss_mb()
+    report['mock_counts'] = {name: dict(mock.counts) for name, mock in farm.items()}
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Regressions beyond tolerance (a fraction) in throughput or tail latency versus a baseline report"""
+    regressions = []
+    for scenario, row in report['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(scenario)
+        if not before:
+            continue
+        if row['throughput_per_s'] < before['throughput_per_s'] * (1 - tolerance):
+            regressions.append(f"{scenario}: throughput {before['throughput_per_s']} -> {row['throughput_per_s']}/s")
+        for key in ('p95_ms', 'p99_ms'):
+            if row[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{scenario}: {key} {before[key]} -> {row[key]}")
+    return regressions
+
+
+def format_report(report):
+    lines = [f"{'scenario':<8} {'seconds':>8} {'per s':>8} {'ok':>6} {'failed':>6} "
+             f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"]
+    for scenario, row in report['scenarios'].items():
+        lines.append(f"{scenario:<8} {row['seconds']:>8} {row['throughput_per_s']:>8} {row['ok']:>6} {row['failed']:>6} "
+                     f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8}"
+                     + (f"  heap peak {row['heap_peak_mb']} MB" if 'heap_peak_mb' in row else ''))
+    lines.append(f"peak RSS: {report['peak_rss_mb']} MB")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='ncra-bench',
+        description='Benchmark the shortening, batch and verification paths against local mock shortener servers.'
+    )
+    parser.add_argument('--urls', type=int, default=200, help='distinct URLs per scenario (default: %(default)s)')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated subset of: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--workers', type=int, default=16, help='concurrent URLs (default: %(default)s)')
+    parser.add_argument('--latency-ms', type=float, default=50, help='mean mock response delay (default: %(default)s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of 500 responses (default: %(default)s)')
+    parser.add_argument('--capacity-rps', type=int, default=0, help='each mock answers 429 above this many requests/s; 0 never (default: %(default)s)')
+    parser.add_argument('--provider-rps', type=float, default=1000.0, help='client-side rate limit per provider (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--trace-memory', action='store_true', help='also report the Python heap peak per scenario (slower)')
+    parser.add_argument('--json', help='write the full report to this file')
+    parser.add_argument('--baseline', help='earlier --json report to compare against; exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed regression versus --baseline (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(
+        url_count=args.urls, scenarios=[s.strip() for s in args.scenarios.split(',') if s.strip()],
+        workers=args.workers, latency_ms=args.latency_ms, error_rate=args.error_rate,
+        capacity_rps=args.capacity_rps, provider_rps=args.provider_rps, seed=args.seed,
+        trace_memory=args.trace_memory
+    )
+    print(format_report(report))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Persistent short-link cache keyed by (service, canonical long URL)"""
+import os
+import sqlite3
+import threading
+import time
+
+from . import config
+from .urls import canonicalize_url
+from .util import singleton
+
+
+class ShortLinkCache:
+    """SQLite-backed cache of issued short links with TTL and LRU eviction"""
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=50000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS short_links (
+                service TEXT NOT NULL,
+                url_key TEXT NOT NULL,
+                short_url TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (service, url_key)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_short_links_access ON short_links (last_access)")
+        self._conn.commit()
+
+    def get(self, service, long_url):
+        key = canonicalize_url(long_url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT short_url, created_at FROM short_links WHERE service = ? AND url_key = ?",
+                (service, key)
+            ).fetchone()
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                if row is not None:
+                    self._conn.execute("DELETE FROM short_links WHERE service = ? AND url_key = ?", (service, key))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE short_links SET last_access = ? WHERE service = ? AND url_key = ?",
+                (now, service, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, service, long_url, short_url):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO short_links VALUES (?, ?, ?, ?, ?)",
+                (service, canonicalize_url(long_url), short_url, now, now)
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM short_links").fetchone()[0]
+            if count > self.max_entries:
+                # Evict the least recently used entries
+                self._conn.execute(
+                    "DELETE FROM short_links WHERE rowid IN "
+                    "(SELECT rowid FROM short_links ORDER BY last_access LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM short_links")
+            self._conn.commit()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM short_links").fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'size': size}
+
+
+class NullCache:
+    """Stand-in used when caching is switched off (NCRA_CACHE=0 or --no-cache)"""
+
+    hits = misses = 0
+
+    def get(self, service, long_url):
+        return None
+
+    def put(self, service, long_url, short_url):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {'hits': 0, 'misses': 0, 'size': 0}
+
+
+@singleton
+def get_link_cache():
+    """Server-wide link cache: memory, then Redis when NCRA_REDIS_URL is set, then SQLite"""
+    from .shared import MemoryCache, RedisCache, TieredLinkCache
+
+    if not config.CACHE_ENABLED:
+        return NullCache()
+    store = ShortLinkCache(
+        os.path.join(config.DATA_DIR, 'cache.sqlite3'),
+        ttl=config.CACHE_TTL,
+        max_entries=config.CACHE_MAX_ENTRIES
+    )
+    memory = MemoryCache(max_entries=config.MEMORY_CACHE_ENTRIES, ttl=config.CACHE_TTL)
+    redis = RedisCache(config.REDIS_URL, ttl=config.CACHE_TTL) if config.REDIS_URL else None
+    return TieredLinkCache(store, memory, redis)
@@ -0,0 +1,152 @@
+"""Headless command-line entry points: ncra-shorten --providers all --input urls.txt --out results.jsonl,
+and ncra-verify --history --out report.csv to re-check links in bulk"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from . import config
+from .providers import SERVICES
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='ncra-shorten',
+        description='Shorten a list of URLs with one or more services, without the Streamlit UI.'
+    )
+    parser.add_argument('--providers', default='all',
+                        help="'all', 'distribute', 'fastest', or a comma-separated list of: " + ', '.join(SERVICES))
+    parser.add_argument('--input', required=True, help="TXT (one URL per line) or CSV file; '-' reads stdin")
+    parser.add_argument('--out', required=True, help='output file; .jsonl writes JSON lines, .parquet Parquet (needs pyarrow), anything else CSV')
+    parser.add_argument('--hedge-ms', type=float, default=config.HEDGE_DELAY * 1000,
+                        help="with --providers fastest, wait this long before starting each extra service; 0 races all at once (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=config.BATCH_WORKERS, help='parallel requests (default: %(default)s)')
+    parser.add_argument('--chunk-size', type=int, default=config.BATCH_CHUNK_SIZE, help='URLs per checkpoint (default: %(default)s)')
+    parser.add_argument('--resume', action='store_true', help='continue from the checkpoint next to --out instead of starting over')
+    parser.add_argument('--data-dir', default=config.DATA_DIR, help='cache directory (default: %(default)s)')
+    parser.add_argument('--no-cache', action='store_true', help='always call the services, ignoring the link cache')
+    parser.add_argument('--metrics-out', help='write Prometheus-format latency metrics to this file when done')
+    parser.add_argument('-q', '--quiet', action='store_true', help='no progress on stderr')
+    return parser.parse_args(argv)
+
+
+def resolve_providers(spec):
+    spec = spec.strip().lower()
+    if spec == 'all':
+        return list(SERVICES)
+    if spec in ('distribute', 'fastest'):
+        return [spec]
+    by_lower = {name.lower(): name for name in SERVICES}
+    names = []
+    for part in spec.split(','):
+        part = part.strip()
+        if part not in by_lower:
+            raise SystemExit(f"ncra-shorten: unknown provider {part!r} (choose from {', '.join(SERVICES)})")
+        names.append(by_lower[part])
+    return names
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    providers = resolve_providers(args.providers)
+    config.DATA_DIR = args.data_dir
+    config.CACHE_ENABLED = config.CACHE_ENABLED and not args.no_cache
+    config.HEDGE_DELAY = args.hedge_ms / 1000
+
+    # The engine is only imported once we know there is work to do
+    from .batch import BATCH_FIELDS, DISTRIBUTE, FASTEST, iter_input_urls, iter_result_rows, process_stream
+    from .export import write_export
+
+    providers = [{'distribute': DISTRIBUTE, 'fastest': FASTEST}.get(name, name) for name in providers]
+    # Parquet is not appendable, so rows go to a CSV work file that is converted once at the end
+    work_path = args.out + '.partial.csv' if args.out.endswith('.parquet') else args.out
+    checkpoint_path = args.out + '.checkpoint.json'
+    if not args.resume:
+        for path in (args.out, work_path, checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+    out_format = 'jsonl' if args.out.endswith('.jsonl') else 'csv'
+
+    source = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    started = time.perf_counter()
+    try:
+        urls = iter_input_urls(source, args.input)
+        for checkpoint in process_stream(urls, providers, SERVICES, work_path, checkpoint_path,
+                                         chunk_size=args.chunk_size, max_workers=args.workers,
+                                         out_format=out_format):
+            if not args.quiet:
+                print(f"\r{checkpoint['rows_done']:,} rows • {checkpoint['succeeded']:,} shortened • "
+                      f"{checkpoint['failed']:,} failed • {time.perf_counter() - started:.1f}s",
+                      end='', file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        print("\nInterrupted; rerun with --resume to continue.", file=sys.stderr)
+        return 130
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+    if not args.quiet:
+        print(file=sys.stderr)
+    if work_path != args.out:
+        write_export(iter_result_rows(work_path), BATCH_FIELDS, args.out, 'parquet')
+        os.remove(work_path)
+        os.remove(checkpoint_path)
+    if args.metrics_out:
+        from .metrics import get_metrics
+        with open(args.metrics_out, 'w') as f:
+            f.write(get_metrics().render_prometheus())
+    return 0 if checkpoint['failed'] == 0 else 1
+
+
+
+def verify_main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='ncra-verify',
+        description='Check short links in bulk, following each redirect chain hop by hop.'
+    )
+    source_group = parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument('--input', help="TXT or CSV file of short links; '-' reads stdin")
+    source_group.add_argument('--history', action='store_true', help='re-check every link in the app history and record the outcome')
+    parser.add_argument('--out', required=True, help='report file; .jsonl writes JSON lines, anything else CSV')
+    parser.add_argument('--workers', type=int, default=config.VERIFY_WORKERS, help='parallel checks (default: %(default)s)')
+    parser.add_argument('--data-dir', default=config.DATA_DIR, help='history directory (default: %(default)s)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='no progress on stderr')
+    args = parser.parse_args(argv)
+    config.DATA_DIR = args.data_dir
+
+    from .batch import iter_input_urls
+    from .history import get_history_store
+    from .verify import VERIFY_FIELDS, revalidate_history, verify_many
+
+    source = None
+    if args.history:
+        results = revalidate_history(get_history_store(), max_workers=args.workers)
+    else:
+        source = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+        results = verify_many(iter_input_urls(source, args.input), max_workers=args.workers)
+    checked = broken = 0
+    try:
+        with open(args.out, 'w', newline='', encoding='utf-8') as out:
+            writer = None if args.out.endswith('.jsonl') else csv.DictWriter(out, VERIFY_FIELDS, extrasaction='ignore')
+            if writer:
+                writer.writeheader()
+            for result in results:
+                hops = ' -> '.join(f"{hop['status']} {hop['url']}" for hop in result['chain'])
+                if writer:
+                    writer.writerow({**result, 'hops': hops})
+                else:
+                    out.write(json.dumps({key: value for key, value in result.items() if key != 'phases'}) + '\n')
+                checked += 1
+                broken += not result['working']
+                if not args.quiet:
+                    print(f"\r{checked:,} checked • {broken:,} broken", end='', file=sys.stderr, flush=True)
+    finally:
+        if source is not None and source is not sys.stdin.buffer:
+            source.close()
+    if not args.quiet:
+        print(file=sys.stderr)
+    return 0 if broken == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
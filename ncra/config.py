@@ -0,0 +1,84 @@
+"""Runtime settings, read from NCRA_* environment variables"""
+import json
+import os
+
+DATA_DIR = os.environ.get('NCRA_DATA_DIR', '.ncra')
+
+# Pooled HTTP sessions
+POOL_CONNECTIONS = int(os.environ.get('NCRA_POOL_CONNECTIONS', 4))
+POOL_MAXSIZE = int(os.environ.get('NCRA_POOL_MAXSIZE', 16))
+HTTP_RETRIES = int(os.environ.get('NCRA_HTTP_RETRIES', 2))
+HTTP_BACKOFF = float(os.environ.get('NCRA_HTTP_BACKOFF', 0.3))
+
+# Serve Prometheus metrics on METRICS_HOST:METRICS_PORT when the port is set; they name hosts and
+# circuit state, so they stay on loopback unless NCRA_METRICS_HOST says otherwise
+METRICS_PORT = int(os.environ.get('NCRA_METRICS_PORT', 0))
+METRICS_HOST = os.environ.get('NCRA_METRICS_HOST', '127.0.0.1')
+
+# Show server-wide maintenance controls (e.g. clearing the link cache) to every visitor
+ADMIN_UI = os.environ.get('NCRA_ADMIN_UI', '0') != '0'
+
+# Short-link cache
+CACHE_ENABLED = os.environ.get('NCRA_CACHE', '1') != '0'
+CACHE_TTL = int(os.environ.get('NCRA_CACHE_TTL', 7 * 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get('NCRA_CACHE_MAX_ENTRIES', 50000))
+MEMORY_CACHE_ENTRIES = int(os.environ.get('NCRA_MEMORY_CACHE_ENTRIES', 10000))
+# Optional shared tier for multi-process deployments, e.g. redis://localhost:6379/0
+REDIS_URL = os.environ.get('NCRA_REDIS_URL', '')
+
+# Query parameters dropped when canonicalizing URLs before shortening (shell-style patterns,
+# comma-separated; set NCRA_STRIP_QUERY_PARAMS='' to keep them all)
+STRIP_QUERY_PARAMS = [p.strip().lower() for p in os.environ.get(
+    'NCRA_STRIP_QUERY_PARAMS', 'utm_*,fbclid,gclid,dclid,msclkid,mc_cid,mc_eid,igshid,_ga,yclid'
+).split(',') if p.strip()]
+# Recently shortened canonical URLs remembered per batch so later duplicates are not re-sent
+DEDUP_INDEX_SIZE = int(os.environ.get('NCRA_DEDUP_INDEX_SIZE', 100000))
+
+# Circuit breakers: open after BREAKER_ERROR_RATE failures among >= BREAKER_MIN_CALLS
+# calls in the last BREAKER_WINDOW seconds, probe again after BREAKER_COOLDOWN seconds
+BREAKER_WINDOW = float(os.environ.get('NCRA_BREAKER_WINDOW', 60))
+BREAKER_MIN_CALLS = int(os.environ.get('NCRA_BREAKER_MIN_CALLS', 5))
+BREAKER_ERROR_RATE = float(os.environ.get('NCRA_BREAKER_ERROR_RATE', 0.5))
+BREAKER_COOLDOWN = float(os.environ.get('NCRA_BREAKER_COOLDOWN', 30))
+BREAKER_SLOW_CALL_MS = float(os.environ.get('NCRA_BREAKER_SLOW_CALL_MS', 5000))
+
+# QR codes: memoized renders, and sheets of at least QR_POOL_THRESHOLD codes use a process pool
+QR_CACHE_SIZE = int(os.environ.get('NCRA_QR_CACHE_SIZE', 1024))
+QR_POOL_THRESHOLD = int(os.environ.get('NCRA_QR_POOL_THRESHOLD', 200))
+
+# Batch processing
+BATCH_WORKERS = int(os.environ.get('NCRA_BATCH_WORKERS', 8))
+BATCH_MAX_ATTEMPTS = int(os.environ.get('NCRA_BATCH_MAX_ATTEMPTS', 4))
+# Single-service batches wait up to this many seconds per URL for an open circuit to let calls through
+BATCH_CIRCUIT_WAIT = float(os.environ.get('NCRA_BATCH_CIRCUIT_WAIT', 120))
+BATCH_CHUNK_SIZE = int(os.environ.get('NCRA_BATCH_CHUNK_SIZE', 500))
+# Batch jobs run in the background at most this many at a time
+JOB_WORKERS = int(os.environ.get('NCRA_JOB_WORKERS', 2))
+
+# Link verification: results are reused for VERIFY_TTL seconds (0 disables the cache)
+VERIFY_TTL = int(os.environ.get('NCRA_VERIFY_TTL', 600))
+VERIFY_TIMEOUT = float(os.environ.get('NCRA_VERIFY_TIMEOUT', 5))
+VERIFY_WORKERS = int(os.environ.get('NCRA_VERIFY_WORKERS', 16))
+
+# Fastest-link mode: delay before each extra hedged request (0 races all services at once)
+HEDGE_DELAY = float(os.environ.get('NCRA_HEDGE_MS', 250)) / 1000
+
+# Built-in shortener, offered only when LOCAL_BASE_URL is set to an address clients can reach
+# (e.g. https://ncra.example.com); codes resolve at LOCAL_BASE_URL/<code>. The app then serves the
+# redirects itself on REDIRECT_HOST:REDIRECT_PORT (port 0 disables that, e.g. when a separate
+# ncra-redirect process does it); give each process writing to the same store its own LOCAL_NODE_ID
+LOCAL_BASE_URL = os.environ.get('NCRA_LOCAL_BASE_URL', '')
+REDIRECT_HOST = os.environ.get('NCRA_REDIRECT_HOST', '127.0.0.1')
+REDIRECT_PORT = int(os.environ.get('NCRA_REDIRECT_PORT', 8080))
+LOCAL_NODE_ID = int(os.environ.get('NCRA_LOCAL_NODE_ID', 0))
+
+# Per-provider overrides of any adapter setting (endpoint, timeout, rate_limit, ...), e.g.
+# NCRA_PROVIDERS='{"is.gd": {"endpoint": "http://127.0.0.1:9001/create.php", "timeout": 3}}'
+PROVIDER_OVERRIDES = json.loads(os.environ.get('NCRA_PROVIDERS', '{}'))
+# Requests per second per service, e.g. NCRA_RATE_LIMITS='{"is.gd": 0.5}' (defaults live in providers.py)
+RATE_LIMITS = json.loads(os.environ.get('NCRA_RATE_LIMITS', '{}'))
+
+# In-process "Mock" provider for load tests
+MOCK_PROVIDER = os.environ.get('NCRA_MOCK_PROVIDER', '0') != '0'
+MOCK_LATENCY_MS = float(os.environ.get('NCRA_MOCK_LATENCY_MS', 50))
+MOCK_ERROR_RATE = float(os.environ.get('NCRA_MOCK_ERROR_RATE', 0.0))
@@ -0,0 +1,123 @@
+"""Single-URL shortening: cache lookup, provider call and link test"""
+import collections
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .cache import get_link_cache
+from .health import call_service, get_health
+from .metrics import get_metrics
+from .shared import get_singleflight
+from .urls import canonicalize_url
+from .ratelimit import get_scoreboard
+from .verify import verify_cached
+
+
+def cached_shorten(service_name, service_func, long_url):
+    """Return (short_url, elapsed, success, cached, skipped), consulting the link cache first.
+
+    cached is also True when the result came from an identical request already in flight.
+    skipped is True when the service's circuit is open and it was not called at all.
+    Equivalent spellings (see canonicalize_url) share one cache entry and call; the service
+    is sent the first caller's URL as entered.
+    """
+    link_cache = get_link_cache()
+    start = time.perf_counter_ns()
+    short_url = link_cache.get(service_name, long_url)
+    if short_url:
+        return short_url, round((time.perf_counter_ns() - start) / 1e6, 2), True, True, False
+
+    def fetch():
+        outcome = call_service(service_name, service_func, long_url)
+        if outcome is not None and outcome[2] and outcome[0]:
+            link_cache.put(service_name, long_url, outcome[0])
+        return outcome
+
+    # Identical requests in flight from other sessions share one upstream call; the key names this
+    # path because batch_shorten coalesces on the same flight group with a different result shape
+    outcome, shared = get_singleflight().do(('shorten', service_name, canonicalize_url(long_url)), fetch)
+    if outcome is None:
+        return None, 0, False, False, True
+    short_url, elapsed, success = outcome
+    return short_url, elapsed, success, shared, False
+
+
+def shorten_and_test(service_name, service_func, long_url, test_links):
+    """Shorten with one service and optionally verify the result (runs in a worker thread)"""
+    short_url, elapsed, success, cached, skipped = cached_shorten(service_name, service_func, long_url)
+    if success and short_url:
+        working = True
+        redirect_url = long_url
+        chain = []
+        if test_links:
+            verification, verified_before = verify_cached(short_url)
+            working, redirect_url, chain = verification['working'], verification['final_url'], verification['chain']
+            if not verified_before:
+                get_metrics().observe(service_name, 'verify', working, verification['elapsed'] * 1e6, verification['phases'])
+        return {
+            'service': service_name,
+            'short_url': short_url,
+            'elapsed': elapsed,
+            'success': True,
+            'working': working,
+            'redirect_url': redirect_url,
+            'chain': chain,
+            'cached': cached,
+            'skipped': False
+        }
+    return {
+        'service': service_name,
+        'short_url': None,
+        'elapsed': elapsed,
+        'success': False,
+        'working': False,
+        'redirect_url': None,
+        'chain': [],
+        'cached': False,
+        'skipped': skipped
+    }
+
+
+# First-wins racing across services
+race_wins = collections.Counter()
+_race_lock = threading.Lock()
+
+
+def race(long_url, services, hedge_delay=0.0, test_links=True):
+    """Return the first successful (and, with test_links, working) result, or None.
+
+    Services are started best-scored first; with hedge_delay > 0 each further service is
+    only started if nothing has won within hedge_delay seconds of the previous one.
+    Services whose circuit is open are left out. Calls still in flight when a winner lands
+    are abandoned.
+    """
+    order = get_scoreboard().ranked(get_health().available(services) or services)
+    executor = ThreadPoolExecutor(max_workers=len(order))
+    pending = set()
+    try:
+        for service_name in order:
+            pending.add(executor.submit(shorten_and_test, service_name, services[service_name], long_url, test_links))
+            winner, pending = _collect_winner(pending, hedge_delay)
+            if winner:
+                return winner
+        while pending:
+            winner, pending = _collect_winner(pending, None)
+            if winner:
+                return winner
+        return None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _collect_winner(pending, timeout):
+    """Wait up to timeout for pending futures; return (winning result or None, still pending)"""
+    done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+    for future in done:
+        result = future.result()
+        if not result['skipped']:
+            get_scoreboard().record(result['service'], result['success'], 0 if result['cached'] else result['elapsed'])
+        if result['success'] and result['working']:
+            with _race_lock:
+                race_wins[result['service']] += 1
+            return result, pending
+    return None, pending
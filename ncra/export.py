@@ -0,0 +1,97 @@
+"""Streaming exports (CSV, JSONL, Parquet) and paged reads of result files"""
+import csv
+import io
+import itertools
+import json
+import os
+import tempfile
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        return False
+    return True
+
+
+def iter_csv(rows, header, chunk_rows=1000):
+    """Encode rows as CSV text chunks without materializing the whole file"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_jsonl(rows, header, chunk_rows=1000):
+    """Encode rows as JSON-lines text chunks, one object per row keyed by header"""
+    for chunk in iter(lambda: list(itertools.islice(rows, chunk_rows)), []):
+        yield ''.join(json.dumps(dict(zip(header, row))) + '\n' for row in chunk)
+
+
+def write_export(rows, header, path, fmt='csv', chunk_rows=10000):
+    """Write an iterable of row tuples to path in chunks, so memory stays flat; returns path.
+
+    Parquet needs pyarrow and writes one row group per chunk. The rows go to a uniquely named
+    work file that replaces path at the end, so concurrent writers never interleave.
+    """
+    rows = iter(rows)
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path) or '.')
+    os.close(fd)
+    try:
+        _write_rows(rows, header, tmp_path, fmt, chunk_rows)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return path
+
+
+def _write_rows(rows, header, tmp_path, fmt, chunk_rows):
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for chunk in iter(lambda: list(itertools.islice(rows, chunk_rows)), []):
+                table = pa.Table.from_pylist([dict(zip(header, row)) for row in chunk],
+                                             schema=writer.schema if writer else None)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema, compression='zstd')
+                writer.write_table(table)
+            if writer is None:
+                pq.write_table(pa.table({name: [] for name in header}), tmp_path)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        encode = iter_jsonl if fmt == 'jsonl' else iter_csv
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            for text in encode(rows, header, chunk_rows):
+                f.write(text)
+
+
+def iter_csv_rows(path):
+    """Stream the data rows of a CSV file as lists (header skipped)"""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        yield from reader
+
+
+def read_page(path, offset, limit):
+    """Rows offset..offset+limit of a CSV file, reading only up to that point"""
+    return list(itertools.islice(iter_csv_rows(path), offset, offset + limit))
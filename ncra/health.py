@@ -0,0 +1,149 @@
+"""Per-service health tracking and circuit breakers"""
+import collections
+import threading
+import time
+
+from . import config
+from .metrics import get_metrics
+from .pool import get_session_pool
+from .util import singleton
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker:
+    """Rolling error-rate/latency window for one service with closed/open/half-open states.
+
+    The circuit opens when at least min_calls calls in the window fail (or take longer than
+    slow_call_ms) at error_threshold or more. After cooldown seconds a single probe call is
+    let through; its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, window=60.0, min_calls=5, error_threshold=0.5, cooldown=30.0, slow_call_ms=5000):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.slow_call_ms = slow_call_ms
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._events = collections.deque()  # (timestamp, ok, latency_ms)
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        while self._events and now - self._events[0][0] > self.window:
+            self._events.popleft()
+
+    def _refresh(self, now):
+        if self.state == OPEN and now - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self._probing = False
+
+    def available(self):
+        """Whether a call would currently be allowed, without claiming the half-open probe"""
+        with self._lock:
+            self._refresh(time.monotonic())
+            return self.state == CLOSED or (self.state == HALF_OPEN and not self._probing)
+
+    def allow(self):
+        with self._lock:
+            self._refresh(time.monotonic())
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, success, latency_ms):
+        now = time.monotonic()
+        ok = bool(success) and latency_ms <= self.slow_call_ms
+        with self._lock:
+            self._events.append((now, ok, latency_ms))
+            self._trim(now)
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if ok:
+                    self.state = CLOSED
+                    self._events.clear()
+                else:
+                    self.state = OPEN
+                    self.opened_at = now
+            elif self.state == CLOSED and len(self._events) >= self.min_calls:
+                errors = sum(1 for _, event_ok, _ in self._events if not event_ok)
+                if errors / len(self._events) >= self.error_threshold:
+                    self.state = OPEN
+                    self.opened_at = now
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            self._trim(now)
+            calls = len(self._events)
+            errors = sum(1 for _, ok, _ in self._events if not ok)
+            latencies = sorted(latency for _, _, latency in self._events)
+            return {
+                'state': self.state,
+                'calls': calls,
+                'error_rate': errors / calls if calls else 0.0,
+                'avg_latency_ms': sum(latencies) / calls if calls else 0.0,
+                'max_latency_ms': latencies[-1] if latencies else 0.0,
+                'retry_in_s': max(self.cooldown - (now - self.opened_at), 0.0) if self.state == OPEN else 0.0
+            }
+
+
+class HealthRegistry:
+    """Lazily created CircuitBreaker per service name"""
+
+    def __init__(self, **breaker_options):
+        self.breaker_options = breaker_options
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, service):
+        breaker = self._breakers.get(service)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(service, CircuitBreaker(**self.breaker_options))
+        return breaker
+
+    def available(self, services):
+        return [service for service in services if self.breaker(service).available()]
+
+    def snapshot(self):
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {service: breaker.snapshot() for service, breaker in breakers.items()}
+
+
+@singleton
+def get_health():
+    return HealthRegistry(
+        window=config.BREAKER_WINDOW,
+        min_calls=config.BREAKER_MIN_CALLS,
+        error_threshold=config.BREAKER_ERROR_RATE,
+        cooldown=config.BREAKER_COOLDOWN,
+        slow_call_ms=config.BREAKER_SLOW_CALL_MS
+    )
+
+
+def call_service(service_name, service_func, long_url):
+    """Call a service through its circuit breaker and record its latency metrics.
+
+    Returns (short_url, elapsed, success), or None without calling when the circuit is open.
+    """
+    breaker = get_health().breaker(service_name)
+    if not breaker.allow():
+        return None
+    http_pool = get_session_pool()
+    http_pool.reset_timing()
+    start = time.perf_counter_ns()
+    short_url, elapsed, success = service_func(long_url)
+    total_ns = time.perf_counter_ns() - start
+    breaker.record(success and short_url, elapsed)
+    get_metrics().observe(service_name, 'shorten', bool(success and short_url), total_ns, http_pool.last_timing())
+    return short_url, elapsed, success
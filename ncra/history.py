@@ -0,0 +1,185 @@
+"""Persistent, indexed history of shortening runs"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from . import config
+from .util import singleton
+
+EXPORT_FIELDS = ['Original URL', 'Service', 'Short URL', 'Speed (ms)', 'Timestamp']
+
+
+class HistoryStore:
+    """SQLite store with one row per run (original URL) and one per service result.
+
+    Runs carry an owner (the app's per-session id); reads, exports and clearing can be
+    limited to one owner, and None means every owner.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY,
+                timestamp TEXT NOT NULL,
+                original_url TEXT NOT NULL,
+                owner TEXT NOT NULL DEFAULT ''
+            );
+            CREATE TABLE IF NOT EXISTS results (
+                run_id INTEGER NOT NULL REFERENCES runs (id),
+                service TEXT NOT NULL,
+                short_url TEXT,
+                elapsed REAL,
+                success INTEGER NOT NULL,
+                working INTEGER,
+                redirect_url TEXT,
+                cached INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_runs_timestamp ON runs (timestamp);
+            CREATE INDEX IF NOT EXISTS idx_runs_original_url ON runs (original_url);
+            CREATE INDEX IF NOT EXISTS idx_results_run ON results (run_id);
+            CREATE INDEX IF NOT EXISTS idx_results_service ON results (service, run_id);
+            CREATE INDEX IF NOT EXISTS idx_results_short_url ON results (short_url);
+        """)
+        if 'owner' not in [column[1] for column in self._conn.execute("PRAGMA table_info(runs)")]:
+            # Stores created before runs had owners
+            self._conn.execute("ALTER TABLE runs ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_owner ON runs (owner, id)")
+        self._conn.commit()
+
+    def add_run(self, original_url, results, owner='', timestamp=None):
+        timestamp = timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            run_id = self._conn.execute(
+                "INSERT INTO runs (timestamp, original_url, owner) VALUES (?, ?, ?)", (timestamp, original_url, owner)
+            ).lastrowid
+            self._conn.executemany(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (run_id, r['service'], r['short_url'], r['elapsed'], int(r['success']),
+                     int(bool(r.get('working'))), r.get('redirect_url'), int(bool(r.get('cached'))))
+                    for r in results
+                ]
+            )
+            self._conn.commit()
+        return run_id
+
+    def _where(self, owner=None, service=None, url_contains=None):
+        clauses, params = [], []
+        if owner is not None:
+            clauses.append("owner = ?")
+            params.append(owner)
+        if service:
+            clauses.append("id IN (SELECT run_id FROM results WHERE service = ?)")
+            params.append(service)
+        if url_contains:
+            clauses.append("original_url LIKE ?")
+            params.append(f"%{url_contains}%")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count_runs(self, owner=None, service=None, url_contains=None):
+        where, params = self._where(owner, service, url_contains)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM runs{where}", params).fetchone()[0]
+
+    def page(self, offset=0, limit=10, owner=None, service=None, url_contains=None):
+        """Runs newest first, each as {'original_url', 'timestamp', 'results': [...]}"""
+        where, params = self._where(owner, service, url_contains)
+        with self._lock:
+            runs = self._conn.execute(
+                f"SELECT id, timestamp, original_url FROM runs{where} ORDER BY id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+            if not runs:
+                return []
+            placeholders = ','.join('?' * len(runs))
+            result_rows = self._conn.execute(
+                "SELECT run_id, service, short_url, elapsed, success, working, redirect_url, cached "
+                f"FROM results WHERE run_id IN ({placeholders}) ORDER BY rowid",
+                [run[0] for run in runs]
+            ).fetchall()
+        by_run = {run_id: [] for run_id, _, _ in runs}
+        for run_id, service, short_url, elapsed, success, working, redirect_url, cached in result_rows:
+            by_run[run_id].append({
+                'service': service, 'short_url': short_url, 'elapsed': elapsed, 'success': bool(success),
+                'working': bool(working), 'redirect_url': redirect_url, 'cached': bool(cached)
+            })
+        return [
+            {'original_url': original_url, 'timestamp': timestamp, 'results': by_run[run_id]}
+            for run_id, timestamp, original_url in runs
+        ]
+
+    def iter_results(self, owner=None, service=None, url_contains=None, successful_only=True, batch_size=1000):
+        """Stream (original_url, service, short_url, elapsed, timestamp) rows oldest first"""
+        where, params = self._where(owner, service, url_contains)
+        query = (
+            "SELECT runs.original_url, results.service, results.short_url, results.elapsed, runs.timestamp "
+            f"FROM results JOIN (SELECT * FROM runs{where}) AS runs ON runs.id = results.run_id"
+        )
+        if successful_only:
+            query += " WHERE results.success = 1"
+        if service:
+            query += (" AND" if successful_only else " WHERE") + " results.service = ?"
+            params = params + [service]
+        # A separate connection so a long export does not hold the writer lock
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(query + " ORDER BY results.run_id", params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+
+    def iter_service_results(self):
+        """Stream (service, success, elapsed, cached) for rebuilding running aggregates"""
+        conn = sqlite3.connect(self.path)
+        try:
+            yield from conn.execute("SELECT service, success, elapsed, cached FROM results")
+        finally:
+            conn.close()
+
+    def iter_short_links(self, service=None, owner=None):
+        """Stream (short_url,) for each distinct successfully issued link"""
+        query = "SELECT DISTINCT short_url FROM results WHERE success = 1 AND short_url IS NOT NULL"
+        params = []
+        if owner is not None:
+            query += " AND run_id IN (SELECT id FROM runs WHERE owner = ?)"
+            params.append(owner)
+        if service:
+            query += " AND service = ?"
+            params.append(service)
+        conn = sqlite3.connect(self.path)
+        try:
+            yield from conn.execute(query, params)
+        finally:
+            conn.close()
+
+    def update_verification(self, short_url, working, redirect_url):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE results SET working = ?, redirect_url = ? WHERE short_url = ?",
+                (int(working), redirect_url, short_url)
+            )
+            self._conn.commit()
+
+    def clear(self, owner=None):
+        """Delete the runs of one owner, or of everyone when owner is None"""
+        where, params = self._where(owner)
+        with self._lock:
+            self._conn.execute(f"DELETE FROM results WHERE run_id IN (SELECT id FROM runs{where})", params)
+            self._conn.execute(f"DELETE FROM runs{where}", params)
+            self._conn.commit()
+
+
+@singleton
+def get_history_store():
+    return HistoryStore(os.path.join(config.DATA_DIR, 'history.sqlite3'))
@@ -0,0 +1,186 @@
+"""Background batch jobs: a persistent SQLite job table worked by a thread pool"""
+import glob
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config
+from .batch import iter_input_urls, process_stream
+from .util import singleton
+
+JOB_FIELDS = ['id', 'name', 'service', 'status', 'progress', 'rows_done', 'succeeded', 'failed',
+              'workers', 'error', 'created_at', 'updated_at', 'owner']
+ACTIVE = ('queued', 'running')
+
+
+class JobQueue:
+    """Batch jobs that outlive Streamlit reruns, sessions and (through checkpoints) restarts.
+
+    Each job's input is copied under DATA_DIR/jobs and processed with process_stream, so its
+    results file grows chunk by chunk and can be read while the job runs. Jobs left queued or
+    running by a previous process are resumed when the queue is created. Jobs carry an owner
+    (the app's per-session id) so each session only lists its own.
+    """
+
+    def __init__(self, directory, max_jobs=2):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix='ncra-job')
+        self._cancelled = set()
+        self._running = set()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, 'jobs.sqlite3'), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                service TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                rows_done INTEGER NOT NULL DEFAULT 0,
+                succeeded INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                workers INTEGER NOT NULL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                owner TEXT NOT NULL DEFAULT ''
+            )
+        """)
+        if 'owner' not in [column[1] for column in self._conn.execute("PRAGMA table_info(jobs)")]:
+            # Job tables created before jobs had owners
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_owner ON jobs (owner, created_at)")
+        self._conn.commit()
+        for job in self.jobs(statuses=ACTIVE):
+            self._executor.submit(self._run, job['id'])
+
+    def paths(self, job_id):
+        """(input, results, checkpoint) file paths of a job"""
+        base = os.path.join(self.directory, job_id)
+        return base + '.input', base + '.csv', base + '.checkpoint.json'
+
+    def submit(self, source, name, service, workers=None, job_id=None, owner=''):
+        """Queue a batch from a binary stream of TXT/CSV input; returns the job id.
+
+        Resubmitting a job_id that is queued, running or done returns it unchanged, and so does
+        resubmitting a cancelled job whose worker is still finishing its current chunk.
+        """
+        job_id = job_id or uuid.uuid4().hex[:16]
+        existing = self.get(job_id)
+        if existing and (existing['status'] not in ('failed', 'cancelled') or job_id in self._running):
+            return job_id
+        input_path = self.paths(job_id)[0]
+        with open(input_path + '.tmp', 'wb') as f:
+            shutil.copyfileobj(source, f, 1 << 20)
+        os.replace(input_path + '.tmp', input_path)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, name, service, status, workers, created_at, updated_at, owner) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, name, service, workers or config.BATCH_WORKERS, now, now, owner)
+            )
+            self._conn.commit()
+        self._cancelled.discard(job_id)
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def cancel(self, job_id):
+        """Stop a job after its current chunk; its checkpoint is kept"""
+        self._cancelled.add(job_id)
+        self._update(job_id, status='cancelled')
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {', '.join(f'{field} = ?' for field in fields)} WHERE id = ?",
+                list(fields.values()) + [job_id]
+            )
+            self._conn.commit()
+
+    def _run(self, job_id):
+        # At most one worker per job, so two never append to the same results file
+        with self._lock:
+            if job_id in self._running:
+                return
+            self._running.add(job_id)
+        try:
+            self._process(job_id)
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+
+    def _process(self, job_id):
+        job = self.get(job_id)
+        if job is None or job['status'] not in ACTIVE or job_id in self._cancelled:
+            return
+        from .providers import SERVICES
+
+        input_path, out_path, checkpoint_path = self.paths(job_id)
+        self._update(job_id, status='running')
+        try:
+            size = max(os.path.getsize(input_path), 1)
+            with open(input_path, 'rb') as source:
+                urls = iter_input_urls(source, job['name'])
+                checkpoints = process_stream(urls, [job['service']], SERVICES, out_path, checkpoint_path,
+                                             max_workers=job['workers'])
+                try:
+                    for checkpoint in checkpoints:
+                        self._update(job_id, rows_done=checkpoint['rows_done'], succeeded=checkpoint['succeeded'],
+                                     failed=checkpoint['failed'], progress=min(source.tell() / size, 1.0))
+                        if job_id in self._cancelled:
+                            return
+                finally:
+                    # Finish both generators while the input is still open
+                    checkpoints.close()
+                    urls.close()
+            self._update(job_id, status='done', progress=1.0)
+        except Exception as e:
+            self._update(job_id, status='failed', error=f"{type(e).__name__}: {e}")
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(zip(JOB_FIELDS, row)) if row else None
+
+    def jobs(self, statuses=None, limit=None, owner=None):
+        """Jobs oldest first, optionally only those in statuses or of one owner (and only the newest limit)"""
+        query = f"SELECT {', '.join(JOB_FIELDS)} FROM jobs"
+        clauses, params = [], []
+        if statuses:
+            clauses.append(f"status IN ({','.join('?' * len(statuses))})")
+            params += list(statuses)
+        if owner is not None:
+            clauses.append("owner = ?")
+            params.append(owner)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY created_at DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [dict(zip(JOB_FIELDS, row)) for row in reversed(rows)]
+
+    def delete(self, job_id):
+        """Forget a finished job and remove its files (including exports and QR sheets made from it)"""
+        self._cancelled.add(job_id)
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._conn.commit()
+        for path in glob.glob(os.path.join(glob.escape(self.directory), glob.escape(job_id) + '.*')):
+            os.remove(path)
+
+
+@singleton
+def get_job_queue():
+    return JobQueue(os.path.join(config.DATA_DIR, 'jobs'), max_jobs=config.JOB_WORKERS)
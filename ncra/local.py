@@ -0,0 +1,147 @@
+"""Built-in shortener: Snowflake-style IDs, base62 codes and a SQLite mapping store"""
+import os
+import sqlite3
+import threading
+import time
+
+from . import config
+from .shared import MemoryCache
+from .urls import canonical_key, canonicalize_url
+from .util import singleton
+
+BASE62 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+_BASE62_INDEX = {c: i for i, c in enumerate(BASE62)}
+
+
+def base62_encode(n):
+    if n == 0:
+        return BASE62[0]
+    digits = []
+    while n:
+        n, r = divmod(n, 62)
+        digits.append(BASE62[r])
+    return ''.join(reversed(digits))
+
+
+def base62_decode(code):
+    """Inverse of base62_encode; raises KeyError on characters outside the alphabet"""
+    n = 0
+    for c in code:
+        n = n * 62 + _BASE62_INDEX[c]
+    return n
+
+
+class SnowflakeIds:
+    """Time-ordered 63-bit IDs: 41 bits of milliseconds, 10 bits of node ID, 12 bits of sequence.
+
+    Unique without coordination as long as every process writing to a store has its own node ID.
+    """
+
+    EPOCH_MS = 1704067200000  # 2024-01-01 UTC
+    NODE_BITS = 10
+    SEQUENCE_BITS = 12
+
+    def __init__(self, node_id=0):
+        if not 0 <= node_id < 1 << self.NODE_BITS:
+            raise ValueError(f"node_id must be in [0, {1 << self.NODE_BITS})")
+        self.node_id = node_id
+        self.last_ms = -1
+        self.sequence = 0
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            now = time.time_ns() // 1_000_000 - self.EPOCH_MS
+            # Never go backwards if the wall clock does
+            now = max(now, self.last_ms)
+            if now == self.last_ms:
+                self.sequence = (self.sequence + 1) & ((1 << self.SEQUENCE_BITS) - 1)
+                if self.sequence == 0:
+                    # Sequence exhausted for this millisecond: move on to the next one
+                    now += 1
+            else:
+                self.sequence = 0
+            self.last_ms = now
+            return (now << (self.NODE_BITS + self.SEQUENCE_BITS)) | (self.node_id << self.SEQUENCE_BITS) | self.sequence
+
+
+class LocalLinkStore:
+    """SQLite mapping of integer IDs to long URLs, with a memory LRU in front for redirects.
+
+    The ID is the table's rowid and the base62 code is derived from it, so no code column or
+    extra index on text is stored; shortening equivalent URLs returns the same code.
+    """
+
+    def __init__(self, path, base_url, node_id=0, cache_entries=100000):
+        self.path = path
+        self.base_url = base_url.rstrip('/')
+        self.ids = SnowflakeIds(node_id)
+        self._memory = MemoryCache(max_entries=cache_entries, ttl=365 * 24 * 3600)
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS links (
+                id INTEGER PRIMARY KEY,
+                url_hash INTEGER NOT NULL,
+                long_url TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_links_hash ON links (url_hash)")
+        self._conn.commit()
+
+    def shorten(self, long_url):
+        """Return the short URL for long_url, creating a mapping if there is none yet"""
+        key = canonical_key(long_url)
+        canonical = canonicalize_url(long_url)
+        with self._lock:
+            for link_id, stored in self._conn.execute("SELECT id, long_url FROM links WHERE url_hash = ?", (key,)):
+                if canonicalize_url(stored) == canonical:
+                    return self.short_url(link_id)
+            while True:
+                link_id = self.ids.next_id()
+                try:
+                    self._conn.execute("INSERT INTO links VALUES (?, ?, ?, ?)", (link_id, key, long_url, time.time()))
+                    break
+                except sqlite3.IntegrityError:
+                    # Another process with the same node ID took this ID
+                    continue
+            self._conn.commit()
+        self._memory.put(link_id, long_url)
+        return self.short_url(link_id)
+
+    def short_url(self, link_id):
+        return f"{self.base_url}/{base62_encode(link_id)}"
+
+    def resolve(self, code):
+        """Long URL for a base62 code, or None"""
+        try:
+            link_id = base62_decode(code)
+        except KeyError:
+            return None
+        long_url = self._memory.get(link_id)
+        if long_url is None:
+            with self._lock:
+                row = self._conn.execute("SELECT long_url FROM links WHERE id = ?", (link_id,)).fetchone()
+            if row is None:
+                return None
+            long_url = row[0]
+            self._memory.put(link_id, long_url)
+        return long_url
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM links").fetchone()[0]
+
+
+@singleton
+def get_local_store():
+    return LocalLinkStore(
+        os.path.join(config.DATA_DIR, 'links.sqlite3'),
+        config.LOCAL_BASE_URL,
+        node_id=config.LOCAL_NODE_ID
+    )
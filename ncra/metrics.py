@@ -0,0 +1,172 @@
+"""Latency histograms and counters per service, with Prometheus text export"""
+import functools
+import math
+import threading
+
+from . import config
+from .util import singleton
+
+PHASES = ('total', 'connect', 'tls', 'ttfb', 'body')
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram:
+    """Log-bucketed histogram of nanosecond latencies giving percentiles within ~2%"""
+
+    GROWTH = 2 ** (1 / 16)
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.sum_ns = 0
+        self.max_ns = 0
+        self._lock = threading.Lock()
+
+    def record(self, ns):
+        ns = max(int(ns), 1)
+        index = int(math.log(ns, self.GROWTH))
+        with self._lock:
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+            self.count += 1
+            self.sum_ns += ns
+            self.max_ns = max(self.max_ns, ns)
+
+    def quantile(self, q):
+        """Approximate q-quantile in nanoseconds (0 when empty)"""
+        with self._lock:
+            if not self.count:
+                return 0
+            rank = q * self.count
+            seen = 0
+            for index in sorted(self.buckets):
+                seen += self.buckets[index]
+                if seen >= rank:
+                    # Geometric midpoint of the bucket, capped at the largest value seen
+                    return min(self.GROWTH ** (index + 0.5), self.max_ns)
+            return self.max_ns
+
+    def mean(self):
+        return self.sum_ns / self.count if self.count else 0
+
+
+class Metrics:
+    """Histograms keyed by (service, op, phase) and outcome counters keyed by (service, op, outcome).
+
+    op is 'shorten' or 'verify'; phases are listed in PHASES.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, service, op, phase='total'):
+        key = (service, op, phase)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, LatencyHistogram())
+        return histogram
+
+    def observe(self, service, op, success, total_ns, phases=None):
+        self.histogram(service, op).record(total_ns)
+        for phase, ns in (phases or {}).items():
+            if phase != 'total' and ns:
+                self.histogram(service, op, phase).record(ns)
+        key = (service, op, 'success' if success else 'failure')
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def summary(self, op, phase='total'):
+        """{service: {'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms'}} for one op/phase"""
+        with self._lock:
+            keys = [key for key in self.histograms if key[1] == op and key[2] == phase]
+        summary = {}
+        for service, _, _ in sorted(keys):
+            histogram = self.histograms[(service, op, phase)]
+            summary[service] = {
+                'count': histogram.count,
+                'mean_ms': histogram.mean() / 1e6,
+                **{f"p{int(q * 100)}_ms": histogram.quantile(q) / 1e6 for q in QUANTILES}
+            }
+        return summary
+
+    def render_prometheus(self):
+        """Prometheus text exposition of everything recorded so far"""
+        lines = [
+            '# HELP ncra_request_duration_seconds Provider call latency by phase.',
+            '# TYPE ncra_request_duration_seconds summary'
+        ]
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        for (service, op, phase), histogram in histograms:
+            labels = f'service="{_escape(service)}",op="{op}",phase="{phase}"'
+            for q in QUANTILES:
+                lines.append(f'ncra_request_duration_seconds{{{labels},quantile="{q}"}} {histogram.quantile(q) / 1e9:.6f}')
+            lines.append(f'ncra_request_duration_seconds_sum{{{labels}}} {histogram.sum_ns / 1e9:.6f}')
+            lines.append(f'ncra_request_duration_seconds_count{{{labels}}} {histogram.count}')
+        lines += [
+            '# HELP ncra_requests_total Provider calls by outcome.',
+            '# TYPE ncra_requests_total counter'
+        ]
+        for (service, op, outcome), value in counters:
+            lines.append(f'ncra_requests_total{{service="{_escape(service)}",op="{op}",outcome="{outcome}"}} {value}')
+        lines += _engine_gauges()
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _engine_gauges():
+    """Connection reuse, cache and circuit state from the other engine singletons"""
+    from .cache import get_link_cache
+    from .health import get_health
+    from .pool import get_session_pool
+
+    lines = ['# TYPE ncra_http_connections_total counter', '# TYPE ncra_http_requests_total counter']
+    for host, stats in sorted(get_session_pool().stats().items()):
+        lines.append(f'ncra_http_connections_total{{host="{_escape(host)}"}} {stats["connections"]}')
+        lines.append(f'ncra_http_requests_total{{host="{_escape(host)}"}} {stats["requests"]}')
+    cache_stats = get_link_cache().stats()
+    lines += [
+        '# TYPE ncra_cache_hits_total counter',
+        f'ncra_cache_hits_total {cache_stats["hits"]}',
+        '# TYPE ncra_cache_misses_total counter',
+        f'ncra_cache_misses_total {cache_stats["misses"]}',
+        '# TYPE ncra_circuit_open gauge'
+    ]
+    for service, health in sorted(get_health().snapshot().items()):
+        lines.append(f'ncra_circuit_open{{service="{_escape(service)}"}} {0 if health["state"] == "closed" else 1}')
+    return lines
+
+
+@singleton
+def get_metrics():
+    return Metrics()
+
+
+@functools.lru_cache(maxsize=None)
+def start_metrics_server(port, host=None):
+    """Serve /metrics on a daemon thread (once per process and port)"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    host = host or config.METRICS_HOST
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = get_metrics().render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='ncra-metrics', daemon=True).start()
+    return server
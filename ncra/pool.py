@@ -0,0 +1,190 @@
+"""Pooled keep-alive HTTP sessions, one per provider host"""
+import contextlib
+import functools
+import threading
+import time
+from urllib.parse import urlsplit
+
+from . import config
+from .util import singleton
+
+# Phase timings (ns) of the request currently running on each thread
+_timing = threading.local()
+
+
+def _add_phase(phase, ns):
+    phases = getattr(_timing, 'phases', None)
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0) + ns
+
+
+@functools.lru_cache(maxsize=None)
+def _timed_adapter_class():
+    """HTTPAdapter whose new connections report connect (DNS + TCP) and TLS handshake time"""
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class TimedHTTPConnection(HTTPConnection):
+        def _new_conn(self):
+            start = time.perf_counter_ns()
+            try:
+                return super()._new_conn()
+            finally:
+                _add_phase('connect', time.perf_counter_ns() - start)
+
+    class TimedHTTPSConnection(HTTPSConnection):
+        def _new_conn(self):
+            start = time.perf_counter_ns()
+            try:
+                return super()._new_conn()
+            finally:
+                _add_phase('connect', time.perf_counter_ns() - start)
+
+        def connect(self):
+            phases = getattr(_timing, 'phases', None) or {}
+            connect_before = phases.get('connect', 0)
+            start = time.perf_counter_ns()
+            try:
+                super().connect()
+            finally:
+                # Whatever connect() spent beyond opening the socket is the TLS handshake
+                spent = time.perf_counter_ns() - start
+                _add_phase('tls', max(spent - (phases.get('connect', 0) - connect_before), 0))
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = TimedHTTPConnection
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = TimedHTTPSConnection
+
+    class TimedHTTPAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                'http': TimedHTTPConnectionPool,
+                'https': TimedHTTPSConnectionPool
+            }
+
+    return TimedHTTPAdapter
+
+
+class SessionPool:
+    """Process-wide cache of requests.Session objects keyed by host.
+
+    Sessions retry connection errors and, unless disabled for the calling thread with
+    status_retries_disabled(), 5xx responses.
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=16, retries=2, backoff_factor=0.3):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _create_session(self, status_retries=True):
+        # requests is imported on first use to keep CLI start-up cheap
+        import requests
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(500, 502, 503, 504) if status_retries else (),
+            raise_on_status=False
+        )
+        adapter = _timed_adapter_class()(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.hooks['response'].append(self._record_response)
+        return session
+
+    def _record_response(self, response, **kwargs):
+        retry_after = response.headers.get('Retry-After')
+        self._local.last = (response.status_code, float(retry_after) if retry_after and retry_after.isdigit() else None)
+
+    def reset_last_response(self):
+        self._local.last = (None, None)
+
+    def last_response(self):
+        """(status_code, retry_after) of the last response received on this thread"""
+        return getattr(self._local, 'last', (None, None))
+
+    @contextlib.contextmanager
+    def status_retries_disabled(self):
+        """Send this thread's requests without retrying 5xx, for callers that pace their own retries"""
+        self._local.status_retries = False
+        try:
+            yield
+        finally:
+            self._local.status_retries = True
+
+    def request(self, method, url, **kwargs):
+        """Send a request on the pooled session for url, timing its phases for last_timing()"""
+        _timing.phases = phases = {'connect': 0, 'tls': 0}
+        start = time.perf_counter_ns()
+        try:
+            response = self.session_for(url).request(method, url, **kwargs)
+        finally:
+            phases['total'] = time.perf_counter_ns() - start
+        # response.elapsed runs from sending until the headers are parsed, per hop
+        headers_ns = sum(int(r.elapsed.total_seconds() * 1e9) for r in response.history + [response])
+        phases['ttfb'] = max(headers_ns - phases['connect'] - phases['tls'], 0)
+        phases['body'] = max(phases['total'] - headers_ns, 0)
+        return response
+
+    def reset_timing(self):
+        _timing.phases = None
+
+    def last_timing(self):
+        """Phase breakdown in ns (total, connect, tls, ttfb, body) of this thread's last request()"""
+        return dict(getattr(_timing, 'phases', None) or {})
+
+    def session_for(self, url):
+        key = (urlsplit(url).netloc.lower(), getattr(self._local, 'status_retries', True))
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = self._sessions[key] = self._create_session(status_retries=key[1])
+        return session
+
+    def stats(self):
+        """Requests sent, connections opened and connections reused per host"""
+        stats = {}
+        with self._lock:
+            sessions = list(self._sessions.items())
+        for (host, _), session in sessions:
+            requests_sent = connections = 0
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in list(pools.keys()):
+                    pool = pools.get(key)
+                    if pool is None:
+                        continue
+                    requests_sent += pool.num_requests
+                    connections += pool.num_connections
+            host_stats = stats.setdefault(host, {'requests': 0, 'connections': 0, 'reused': 0})
+            host_stats['requests'] += requests_sent
+            host_stats['connections'] += connections
+            host_stats['reused'] = max(host_stats['requests'] - host_stats['connections'], 0)
+        return stats
+
+
+@singleton
+def get_session_pool():
+    return SessionPool(
+        pool_connections=config.POOL_CONNECTIONS,
+        pool_maxsize=config.POOL_MAXSIZE,
+        retries=config.HTTP_RETRIES,
+        backoff_factor=config.HTTP_BACKOFF
+    )
@@ -0,0 +1,54 @@
+"""Rerun timing for the Streamlit script: full runs, first renders and each tab fragment"""
+import contextlib
+import threading
+import time
+
+from .metrics import LatencyHistogram
+from .util import singleton
+
+
+class RerunProfiler:
+    """A LatencyHistogram and last duration per named section, shared by every session"""
+
+    def __init__(self):
+        self.sections = {}
+        self.last_ns = {}
+        self._lock = threading.Lock()
+
+    def record(self, section, ns):
+        histogram = self.sections.get(section)
+        if histogram is None:
+            with self._lock:
+                histogram = self.sections.setdefault(section, LatencyHistogram())
+        histogram.record(ns)
+        self.last_ns[section] = ns
+
+    @contextlib.contextmanager
+    def timed(self, section):
+        """Time a block, or a function when used as a decorator"""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            # Also reached when Streamlit stops the block early to rerun
+            self.record(section, time.perf_counter_ns() - start)
+
+    def rows(self):
+        with self._lock:
+            sections = dict(self.sections)
+        return [
+            {
+                'Section': section,
+                'Runs': histogram.count,
+                'Last (ms)': round(self.last_ns.get(section, 0) / 1e6, 1),
+                'p50 (ms)': round(histogram.quantile(0.5) / 1e6, 1),
+                'p95 (ms)': round(histogram.quantile(0.95) / 1e6, 1),
+                'Max (ms)': round(histogram.max_ns / 1e6, 1)
+            }
+            for section, histogram in sections.items()
+        ]
+
+
+@singleton
+def get_profiler():
+    return RerunProfiler()
@@ -0,0 +1,117 @@
+"""Provider registry: declarative adapters for each shortening service, with timing"""
+import random
+import time
+import zlib
+
+from . import config
+from .local import base62_encode, get_local_store
+from .pool import get_session_pool
+
+
+def parse_text(response):
+    """Plain-text APIs: a 200 whose body is the short URL"""
+    text = response.text.strip()
+    if response.status_code == 200 and text.startswith('http'):
+        return text
+    return None
+
+
+class Provider:
+    """A shortening service; calling it returns (short_url, elapsed_ms, success).
+
+    Subclasses implement fetch(long_url), returning the short URL or None. Concurrency,
+    caching, rate limiting, circuit breaking and metrics are applied around the call by the
+    engine and batch layers, the same way for every registered provider.
+    """
+
+    def __init__(self, name, rate_limit=1.0, timeout=10):
+        self.name = name
+        self.rate_limit = rate_limit
+        self.timeout = timeout
+
+    def fetch(self, long_url):
+        raise NotImplementedError
+
+    def configure(self, **overrides):
+        for field, value in overrides.items():
+            if not hasattr(self, field):
+                raise ValueError(f"{self.name}: unknown provider setting {field!r}")
+            setattr(self, field, value)
+        return self
+
+    def __call__(self, long_url):
+        start = time.perf_counter_ns()
+        try:
+            short_url = self.fetch(long_url)
+            return short_url, round((time.perf_counter_ns() - start) / 1e6, 2), short_url is not None
+        except Exception:
+            # Still report how long we waited (e.g. a full timeout) so health tracking sees it
+            return None, round((time.perf_counter_ns() - start) / 1e6, 2), False
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r})"
+
+
+class HttpProvider(Provider):
+    """Adapter for an HTTP API; '{url}' in params or data values is replaced by the long URL"""
+
+    def __init__(self, name, endpoint, method='GET', params=None, data=None, parser=parse_text, **options):
+        super().__init__(name, **options)
+        self.endpoint = endpoint
+        self.method = method
+        self.params = params
+        self.data = data
+        self.parser = parser
+
+    def fetch(self, long_url):
+        fill = lambda fields: {key: value.format(url=long_url) for key, value in fields.items()} if fields else None
+        response = get_session_pool().request(self.method, self.endpoint, params=fill(self.params),
+                                              data=fill(self.data), timeout=self.timeout)
+        return self.parser(response)
+
+
+class LocalProvider(Provider):
+    """The built-in shortener: no network round trip"""
+
+    def fetch(self, long_url):
+        return get_local_store().shorten(long_url)
+
+
+class MockProvider(Provider):
+    """In-process stand-in with configurable latency and failure rate, for load tests"""
+
+    def __init__(self, name, latency_ms=50, error_rate=0.0, **options):
+        super().__init__(name, **options)
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+
+    def fetch(self, long_url):
+        # Exponentially distributed around the mean, like a real service's long tail
+        time.sleep(random.expovariate(1000 / self.latency_ms) if self.latency_ms else 0)
+        if random.random() < self.error_rate:
+            return None
+        return f"https://mock.invalid/{base62_encode(zlib.crc32(long_url.encode()))}"
+
+
+# Registered providers by display name, in menu order (the first is the default)
+SERVICES = {}
+
+
+def register(provider):
+    """Add a provider, applying NCRA_PROVIDERS / NCRA_RATE_LIMITS overrides for its name"""
+    provider.configure(**config.PROVIDER_OVERRIDES.get(provider.name, {}))
+    if provider.name in config.RATE_LIMITS:
+        provider.rate_limit = config.RATE_LIMITS[provider.name]
+    SERVICES[provider.name] = provider
+    return provider
+
+
+if config.LOCAL_BASE_URL:
+    register(LocalProvider('NCRA Local', rate_limit=1000.0))
+register(HttpProvider('ShortURL.at', 'https://www.shorturl.at/shortener.php', method='POST', data={'url': '{url}'}))
+register(HttpProvider('is.gd', 'https://is.gd/create.php', params={'format': 'simple', 'url': '{url}'}))
+register(HttpProvider('v.gd', 'https://v.gd/create.php', params={'format': 'simple', 'url': '{url}'}))
+register(HttpProvider('clck.ru', 'https://clck.ru/--', method='POST', data={'url': '{url}'}, rate_limit=2.0))
+register(HttpProvider('ulvis.net', 'https://ulvis.net/api.php', params={'url': '{url}'}))
+if config.MOCK_PROVIDER:
+    register(MockProvider('Mock', latency_ms=config.MOCK_LATENCY_MS, error_rate=config.MOCK_ERROR_RATE, rate_limit=1000.0))
@@ -0,0 +1,82 @@
+"""QR code rendering with memoization and bulk QR sheets"""
+import csv
+import functools
+import io
+import itertools
+import multiprocessing
+import os
+import re
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from . import config
+
+
+@functools.lru_cache(maxsize=config.QR_CACHE_SIZE)
+def render_qr(url, box_size=10, border=5, fmt='png'):
+    """QR code for url as PNG or SVG bytes, memoized by (url, box_size, border, fmt)"""
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, box_size=box_size, border=border)
+    qr.add_data(url)
+    qr.make(fit=True)
+    buffered = io.BytesIO()
+    if fmt == 'svg':
+        from qrcode.image.svg import SvgPathImage
+
+        qr.make_image(image_factory=SvgPathImage).save(buffered)
+    else:
+        # Black on white renders as a 1-bit image, which keeps the PNG small
+        img = qr.make_image(fill_color="black", back_color="white")
+        img.save(buffered, format="PNG", optimize=True)
+    return buffered.getvalue()
+
+
+def _render_entry(args):
+    name, url, box_size, border, fmt = args
+    return name, url, render_qr(url, box_size, border, fmt)
+
+
+def build_qr_sheet(items, path, box_size=10, border=4, fmt='png', max_workers=None, chunk_size=1024):
+    """Write a ZIP archive with one QR image per (name, url) item plus an index.csv to path.
+
+    Items are read lazily and each image goes straight into the file, so memory does not grow
+    with the batch. Large sheets are rendered in a process pool, chunk_size items at a time;
+    the spawn context avoids forking a multi-threaded server process. Returns path.
+    """
+    jobs = ((_safe_name(name, idx), url, box_size, border, fmt) for idx, (name, url) in enumerate(items))
+    head = list(itertools.islice(jobs, config.QR_POOL_THRESHOLD))
+    if len(head) < config.QR_POOL_THRESHOLD:
+        rendered = map(_render_entry, head)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+        pending = itertools.chain(head, jobs)
+        # Executor.map submits everything up front, so hand it one chunk at a time
+        rendered = itertools.chain.from_iterable(
+            executor.map(_render_entry, chunk, chunksize=64)
+            for chunk in iter(lambda: list(itertools.islice(pending, chunk_size)), [])
+        )
+    tmp_path = path + '.tmp'
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_STORED) as archive, \
+                tempfile.TemporaryFile('w+', newline='', encoding='utf-8') as index:
+            writer = csv.writer(index)
+            writer.writerow(['file', 'url'])
+            for name, url, image in rendered:
+                archive.writestr(f"{name}.{fmt}", image)
+                writer.writerow([f"{name}.{fmt}", url])
+            index.seek(0)
+            with archive.open("index.csv", 'w') as entry:
+                for block in iter(lambda: index.read(1 << 16), ''):
+                    entry.write(block.encode('utf-8'))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    os.replace(tmp_path, path)
+    return path
+
+
+def _safe_name(name, idx):
+    return f"{idx:05d}_" + re.sub(r'[^A-Za-z0-9._-]+', '_', name)[:60]
@@ -0,0 +1,87 @@
+"""Per-service rate limiting and health scoring for batch jobs"""
+import random
+import threading
+import time
+
+from .providers import SERVICES
+from .util import singleton
+
+
+class TokenBucket:
+    """Thread-safe token bucket whose refill rate backs off on 429/5xx (AIMD)"""
+
+    def __init__(self, rate, burst=1, min_rate=0.05):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.1)
+
+    def on_throttle(self, retry_after=None):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+
+class ProviderScoreboard:
+    """Observed latency (EWMA) and success rate per service, used to weight batch distribution"""
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, service, success, elapsed_ms):
+        with self._lock:
+            # Optimistic prior so untried services get traffic
+            stats = self._stats.setdefault(service, {'latency': 500.0, 'success': 1.0, 'count': 0})
+            if success and elapsed_ms:
+                stats['latency'] += self.alpha * (elapsed_ms - stats['latency'])
+            stats['success'] += self.alpha * ((1.0 if success else 0.0) - stats['success'])
+            stats['count'] += 1
+
+    def weight(self, service):
+        stats = self._stats.get(service, {'latency': 500.0, 'success': 1.0})
+        return max(stats['success'], 0.02) / max(stats['latency'], 1.0)
+
+    def ranked(self, services):
+        return sorted(services, key=self.weight, reverse=True)
+
+    def choose(self, services):
+        services = list(services)
+        return random.choices(services, weights=[self.weight(s) for s in services])[0]
+
+    def snapshot(self):
+        with self._lock:
+            return {service: dict(stats) for service, stats in self._stats.items()}
+
+
+@singleton
+def get_rate_limiters():
+    return {name: TokenBucket(provider.rate_limit, burst=max(1, int(provider.rate_limit))) for name, provider in SERVICES.items()}
+
+
+@singleton
+def get_scoreboard():
+    return ProviderScoreboard()
@@ -0,0 +1,101 @@
+"""Asyncio HTTP redirect server for links issued by the built-in shortener: ncra-redirect --port 8080"""
+import argparse
+import asyncio
+import functools
+import logging
+import sys
+import threading
+
+from . import config
+from .local import get_local_store
+from .urls import iri_to_uri
+
+_NOT_FOUND = b'Not found\n'
+
+
+def _response(status, headers, body=b'', head=False, keep_alive=True):
+    lines = [f"HTTP/1.1 {status}"]
+    lines += [f"{name}: {value}" for name, value in headers]
+    lines.append(f"Content-Length: {len(body)}")
+    lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+    payload = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+    return payload if head else payload + body
+
+
+async def handle_connection(reader, writer, store):
+    """Serve HTTP/1.1 requests on one connection until the client closes it"""
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                break
+            request_line, _, header_block = head.decode('latin-1').partition('\r\n')
+            parts = request_line.split(' ')
+            if len(parts) != 3:
+                writer.write(_response('400 Bad Request', [], keep_alive=False))
+                break
+            method, target, version = parts
+            headers = header_block.lower()
+            keep_alive = 'connection: close' not in headers and (version == 'HTTP/1.1' or 'connection: keep-alive' in headers)
+            code = target.split('?', 1)[0].strip('/')
+            long_url = store.resolve(code) if code and method in ('GET', 'HEAD') else None
+            if long_url:
+                writer.write(_response('301 Moved Permanently', [('Location', iri_to_uri(long_url)), ('Cache-Control', 'max-age=86400')],
+                                       head=method == 'HEAD', keep_alive=keep_alive))
+            else:
+                writer.write(_response('404 Not Found', [('Content-Type', 'text/plain')], _NOT_FOUND,
+                                       head=method == 'HEAD', keep_alive=keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+async def serve(host, port, store=None):
+    store = store or get_local_store()
+    server = await asyncio.start_server(functools.partial(handle_connection, store=store), host, port, backlog=1024)
+    async with server:
+        await server.serve_forever()
+
+
+@functools.lru_cache(maxsize=None)
+def start_redirect_server(port, host=None):
+    """Run the redirect server on a daemon thread (once per process and port)"""
+    host = host or config.REDIRECT_HOST
+
+    def run():
+        try:
+            asyncio.run(serve(host, port))
+        except OSError as e:
+            # Often a standalone ncra-redirect already serving the same store, but say so either way
+            logging.getLogger(__name__).warning("Redirect server not started on %s:%s: %s", host, port, e)
+
+    thread = threading.Thread(target=run, name='ncra-redirect', daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='ncra-redirect', description='Serve redirects for links created by the built-in shortener.')
+    parser.add_argument('--host', default=config.REDIRECT_HOST, help='address to bind (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=config.REDIRECT_PORT or 8080)
+    parser.add_argument('--data-dir', default=config.DATA_DIR, help='directory holding links.sqlite3 (default: %(default)s)')
+    args = parser.parse_args(argv)
+    config.DATA_DIR = args.data_dir
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    print(f"Redirecting {config.LOCAL_BASE_URL}/<code> on {args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
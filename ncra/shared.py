@@ -0,0 +1,188 @@
+"""Server-wide result sharing: in-memory and Redis cache tiers plus request coalescing"""
+import collections
+import threading
+import time
+
+from .urls import canonicalize_url
+from .util import singleton
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution of the work"""
+
+    class _Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Run fn() once for all concurrent callers of key; returns (result, shared)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+
+class MemoryCache:
+    """Thread-safe LRU dict with a per-entry TTL"""
+
+    def __init__(self, max_entries=10000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    """Redis (or compatible) tier shared by every server process; errors degrade to misses"""
+
+    def __init__(self, url, ttl=3600, prefix='ncra:link:'):
+        import redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._errors = (redis.RedisError, OSError)
+
+    def get(self, key):
+        try:
+            value = self._client.get(self.prefix + key)
+        except self._errors:
+            return None
+        return value.decode() if value is not None else None
+
+    def put(self, key, value):
+        try:
+            self._client.set(self.prefix + key, value, ex=max(int(self.ttl), 1))
+        except self._errors:
+            pass
+
+    def clear(self):
+        try:
+            keys = list(self._client.scan_iter(match=self.prefix + '*', count=1000))
+            if keys:
+                self._client.delete(*keys)
+        except self._errors:
+            pass
+
+
+class TieredLinkCache:
+    """Memory -> Redis (optional) -> SQLite lookup with write-through to every tier.
+
+    Same interface as ShortLinkCache; hits on a slower tier are promoted to the faster ones.
+    """
+
+    def __init__(self, store, memory, redis=None):
+        self.store = store
+        self.memory = memory
+        self.redis = redis
+        self.hits = self.misses = 0
+        self.memory_hits = self.redis_hits = 0
+        self._lock = threading.Lock()
+
+    def _count(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def get(self, service, long_url):
+        key = f"{service}\x1f{canonicalize_url(long_url)}"
+        short_url = self.memory.get(key)
+        if short_url:
+            self._count(hits=1, memory_hits=1)
+            return short_url
+        if self.redis is not None:
+            short_url = self.redis.get(key)
+            if short_url:
+                self.memory.put(key, short_url)
+                self._count(hits=1, redis_hits=1)
+                return short_url
+        short_url = self.store.get(service, long_url)
+        if short_url:
+            self.memory.put(key, short_url)
+            if self.redis is not None:
+                self.redis.put(key, short_url)
+            self._count(hits=1)
+        else:
+            self._count(misses=1)
+        return short_url
+
+    def put(self, service, long_url, short_url):
+        key = f"{service}\x1f{canonicalize_url(long_url)}"
+        self.memory.put(key, short_url)
+        if self.redis is not None:
+            self.redis.put(key, short_url)
+        self.store.put(service, long_url, short_url)
+
+    def clear(self):
+        self.memory.clear()
+        if self.redis is not None:
+            self.redis.clear()
+        self.store.clear()
+        with self._lock:
+            self.hits = self.misses = self.memory_hits = self.redis_hits = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': self.store.stats()['size'],
+            'memory_hits': self.memory_hits,
+            'redis_hits': self.redis_hits,
+            'coalesced': get_singleflight().coalesced
+        }
+
+
+@singleton
+def get_singleflight():
+    return SingleFlight()
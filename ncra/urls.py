@@ -0,0 +1,90 @@
+"""URL validation, normalization and canonicalization"""
+import fnmatch
+import hashlib
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
+
+from . import config
+
+
+def is_valid_url(url_string):
+    if not url_string:
+        return False
+    return url_string.startswith(('http://', 'https://'))
+
+
+def normalize_url(url):
+    """Normalize a URL so trivially different spellings share a cache key.
+
+    The fragment is kept: single-page apps route on it, so '#/a' and '#/b' are different pages.
+    URLs whose authority does not parse are left as written rather than rejected.
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        # e.g. an unclosed IPv6 bracket
+        return url.strip()
+    scheme = parts.scheme.lower()
+    try:
+        port = parts.port
+    except ValueError:
+        # A port that is not a number in range (http://host:port/, http://host:99999/)
+        netloc = parts.netloc
+    else:
+        host = (parts.hostname or '').lower()
+        if ':' in host:
+            # hostname drops an IPv6 literal's brackets
+            host = f"[{host}]"
+        netloc = host
+        if port and not ((scheme == 'http' and port == 80) or (scheme == 'https' and port == 443)):
+            netloc = f"{host}:{port}"
+        if parts.username:
+            netloc = f"{parts.username}{':' + parts.password if parts.password else ''}@{netloc}"
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, parts.fragment))
+
+
+def canonicalize_url(url):
+    """Key under which equivalent spellings of a URL share cache entries and upstream calls.
+
+    On top of normalize_url: query parameters are sorted, tracking parameters matching
+    config.STRIP_QUERY_PARAMS (utm_*, fbclid, ...) are dropped, and a trailing slash is
+    removed from any path other than '/'. Only a key: services are sent the URL as entered.
+    """
+    normalized = normalize_url(url)
+    try:
+        parts = urlsplit(normalized)
+    except ValueError:
+        return normalized
+    # Sorted by name only, so repeated parameters keep their relative order
+    query = sorted(
+        ((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+         if not any(fnmatch.fnmatchcase(name.lower(), pattern) for pattern in config.STRIP_QUERY_PARAMS)),
+        key=lambda param: param[0]
+    )
+    return urlunsplit((parts.scheme, parts.netloc, parts.path.rstrip('/') or '/', urlencode(query), parts.fragment))
+
+
+def canonical_key(url):
+    """Signed 64-bit hash of the canonical URL, for compact dedup indexes"""
+    digest = hashlib.blake2b(canonicalize_url(url).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def iri_to_uri(url):
+    """ASCII form of a URL for HTTP headers: IDNA host, UTF-8 percent-escapes elsewhere.
+
+    Reserved characters and existing %XX escapes are kept, so URIs pass through unchanged.
+    """
+    if url.isascii() and url.isprintable() and ' ' not in url:
+        return url
+    parts = urlsplit(url)
+    netloc = parts.netloc
+    if not netloc.isascii():
+        userinfo, at, hostport = netloc.rpartition('@')
+        host, colon, port = hostport.partition(':')
+        try:
+            host = host.encode('idna').decode('ascii')
+        except UnicodeError:
+            pass
+        netloc = userinfo + at + host + colon + port
+    return quote(urlunsplit((parts.scheme, netloc, parts.path, parts.query, parts.fragment)),
+                 safe="!#$%&'()*+,/:;=?@[]~")
@@ -0,0 +1,20 @@
+"""Small shared helpers"""
+import functools
+import threading
+
+
+def singleton(factory):
+    """Memoize a zero-argument factory; unlike lru_cache, concurrent first calls build one instance"""
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(factory)
+    def get():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    get.cache_clear = instance.clear
+    return get
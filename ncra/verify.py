@@ -0,0 +1,94 @@
+"""Link verification: follow redirect chains hop by hop over the pooled sessions, in bulk"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+
+from . import config
+from .pool import get_session_pool
+from .shared import MemoryCache
+from .util import singleton
+
+# Statuses servers use to refuse HEAD; the hop is retried with GET (body not downloaded)
+HEAD_REJECTED = {400, 403, 405, 501}
+VERIFY_FIELDS = ['short_url', 'working', 'status', 'final_url', 'hops', 'elapsed']
+
+
+def verify_link(short_url, max_hops=10, timeout=5):
+    """Follow short_url's redirects one request at a time.
+
+    Returns {'short_url', 'working', 'status', 'final_url', 'chain', 'elapsed', 'phases'}, where
+    chain lists each hop as {'url', 'method', 'status', 'ms'} and phases sums the connection
+    phase timings (ns) over all hops.
+    """
+    http_pool = get_session_pool()
+    chain = []
+    phases = {}
+    url = short_url
+    method = 'HEAD'
+    status = None
+    start = time.perf_counter_ns()
+    try:
+        while len(chain) <= max_hops:
+            hop_start = time.perf_counter_ns()
+            http_pool.reset_timing()
+            response = http_pool.request(method, url, allow_redirects=False, stream=True, timeout=timeout)
+            response.close()
+            for phase, ns in http_pool.last_timing().items():
+                phases[phase] = phases.get(phase, 0) + ns
+            if method == 'HEAD' and response.status_code in HEAD_REJECTED:
+                method = 'GET'
+                continue
+            status = response.status_code
+            chain.append({'url': url, 'method': method, 'status': status,
+                          'ms': round((time.perf_counter_ns() - hop_start) / 1e6, 2)})
+            location = response.headers.get('Location')
+            if not (response.is_redirect and location):
+                break
+            url = urljoin(url, location)
+    except Exception:
+        status = None
+    return {
+        'short_url': short_url,
+        'working': status == 200,
+        'status': status,
+        'final_url': url if status == 200 else None,
+        'chain': chain,
+        'elapsed': round((time.perf_counter_ns() - start) / 1e6, 2),
+        'phases': phases
+    }
+
+
+@singleton
+def get_verify_cache():
+    return MemoryCache(max_entries=config.MEMORY_CACHE_ENTRIES, ttl=config.VERIFY_TTL)
+
+
+def verify_cached(short_url):
+    """verify_link through the verification cache; returns (result, cached)"""
+    verify_cache = get_verify_cache()
+    result = verify_cache.get(short_url) if config.VERIFY_TTL else None
+    if result is not None:
+        return result, True
+    result = verify_link(short_url, timeout=config.VERIFY_TIMEOUT)
+    if config.VERIFY_TTL:
+        verify_cache.put(short_url, result)
+    return result, False
+
+
+def verify_many(short_urls, max_workers=None):
+    """Verify many links concurrently, yielding each distinct link's result as it completes"""
+    unique = list(dict.fromkeys(url for url in short_urls if url))
+    if not unique:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers or config.VERIFY_WORKERS, len(unique))) as executor:
+        futures = [executor.submit(verify_cached, url) for url in unique]
+        for future in as_completed(futures):
+            yield future.result()[0]
+
+
+def revalidate_history(history_store, service=None, max_workers=None, owner=None):
+    """Re-check every distinct short link in the history (or one owner's), saving the outcome; yields each result"""
+    links = (short_url for short_url, in history_store.iter_short_links(service, owner))
+    for result in verify_many(links, max_workers):
+        history_store.update_verification(result['short_url'], result['working'], result['final_url'])
+        yield result
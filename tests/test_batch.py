@@ -0,0 +1,50 @@
+"""Batch shortening rides out a service's open circuit instead of failing its rows"""
+import threading
+
+import pytest
+
+from ncra import config
+from ncra.batch import run_batch
+from ncra.cache import get_link_cache
+from ncra.health import get_health
+from ncra.providers import SERVICES, Provider
+from ncra.ratelimit import get_rate_limiters
+from ncra.shared import get_singleflight
+
+
+class Flaky(Provider):
+    """Fails its first failures calls, then issues numbered short links"""
+
+    def __init__(self, failures):
+        super().__init__('Flaky', rate_limit=1000.0)
+        self.failures = failures
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def fetch(self, long_url):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        return None if calls <= self.failures else f"https://short.example/{calls}"
+
+
+@pytest.fixture
+def flaky(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(config, 'CACHE_ENABLED', False)
+    monkeypatch.setattr(config, 'BREAKER_COOLDOWN', 0.2)
+    provider = Flaky(failures=6)
+    monkeypatch.setitem(SERVICES, provider.name, provider)
+    for factory in (get_link_cache, get_rate_limiters, get_health, get_singleflight):
+        factory.cache_clear()
+    yield provider
+    for factory in (get_link_cache, get_rate_limiters, get_health, get_singleflight):
+        factory.cache_clear()
+
+
+def test_single_service_batch_waits_out_an_open_circuit(flaky):
+    urls = [f"https://example.com/{i}" for i in range(300)]
+    results = list(run_batch(urls, flaky.name, SERVICES))
+    assert get_health().breaker(flaky.name).opened_at, "the failures should have opened the circuit"
+    assert len(results) == 300
+    assert all(success for _, _, _, success in results)
@@ -0,0 +1,94 @@
+"""Canonical URLs are only keys: services must be sent the URL as entered"""
+import pytest
+
+from ncra import config
+from ncra.batch import run_batch
+from ncra.cache import get_link_cache
+from ncra.engine import cached_shorten
+from ncra.providers import SERVICES, Provider
+from ncra.ratelimit import get_rate_limiters
+from ncra.urls import canonical_key, normalize_url
+
+# Each of these used to reach the service rewritten by canonicalize_url
+INPUTS = [
+    'https://app.example.com/#/dashboard/42',
+    'https://example.com/search?x=1;y=2',
+    'https://example.com/dir/',
+    'https://example.com/page?flag',
+]
+
+
+class Recorder(Provider):
+    """Issues numbered short links and remembers every URL it was sent"""
+
+    def __init__(self):
+        super().__init__('Recorder', rate_limit=1000.0)
+        self.calls = []
+
+    def fetch(self, long_url):
+        self.calls.append(long_url)
+        return f"https://short.example/{len(self.calls)}"
+
+
+@pytest.fixture
+def recorder(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(config, 'CACHE_ENABLED', False)
+    provider = Recorder()
+    monkeypatch.setitem(SERVICES, provider.name, provider)
+    get_link_cache.cache_clear()
+    get_rate_limiters.cache_clear()
+    yield provider
+    get_link_cache.cache_clear()
+    get_rate_limiters.cache_clear()
+
+
+def test_fragment_is_part_of_the_key():
+    assert normalize_url('https://Site.example/#/a') == 'https://site.example/#/a'
+    assert canonical_key('https://site.example/#/a') != canonical_key('https://site.example/#/b')
+
+
+@pytest.mark.parametrize('url', INPUTS)
+def test_single_url_is_sent_as_entered(recorder, url):
+    short_url, _, success, _, _ = cached_shorten(recorder.name, recorder, url)
+    assert success and short_url
+    assert recorder.calls == [url]
+
+
+def test_batch_urls_are_sent_as_entered(recorder):
+    results = list(run_batch(INPUTS, recorder.name, SERVICES))
+    assert sorted(recorder.calls) == sorted(INPUTS)
+    assert all(success for _, _, _, success in results)
+
+
+def test_equivalent_spellings_share_the_first_seen_url(recorder):
+    urls = ['https://example.com/dir/', 'https://Example.com/dir', 'https://example.com/dir/?utm_source=mail']
+    results = sorted(run_batch(urls, recorder.name, SERVICES))
+    assert recorder.calls == [urls[0]]
+    assert {short_url for _, _, short_url, _ in results} == {'https://short.example/1'}
+    assert [idx for idx, _, _, _ in results] == [0, 1, 2]
+
+
+def test_fragment_routes_are_shortened_separately(recorder):
+    urls = ['https://app.example.com/#/a', 'https://app.example.com/#/b']
+    list(run_batch(urls, recorder.name, SERVICES))
+    assert sorted(recorder.calls) == urls
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('http://bad:port/x', 'http://bad:port/x'),
+    ('http://a:99999/', 'http://a:99999/'),
+    ('http://[::1/x', 'http://[::1/x'),
+    ('http://[::1]:8080/x', 'http://[::1]:8080/x'),
+    ('HTTP://[2001:DB8::1]:80/', 'http://[2001:db8::1]/'),
+])
+def test_unusual_authorities_normalize_without_raising(url, expected):
+    assert normalize_url(url) == expected
+    assert canonical_key(url) == canonical_key(expected)
+
+
+def test_batch_survives_unparseable_ports(recorder):
+    urls = ['http://bad:port/x', 'http://a:99999/', 'http://[::1]:8080/x']
+    results = list(run_batch(urls, recorder.name, SERVICES))
+    assert sorted(recorder.calls) == sorted(urls)
+    assert all(success for _, _, _, success in results)